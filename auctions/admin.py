@@ -1,9 +1,11 @@
 from django.contrib import admin
-from .models import User, Listing, Bid, Comment, Watchlist
+from .models import User, Listing, Bid, Comment, Job, ProxyBid, Watchlist
 
 # Register your models here.
 admin.site.register(User)
 admin.site.register(Listing)
 admin.site.register(Bid)
 admin.site.register(Comment)
+admin.site.register(ProxyBid)
 admin.site.register(Watchlist)
+admin.site.register(Job)
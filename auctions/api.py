@@ -0,0 +1,134 @@
+import hashlib
+
+from .models import Listing
+from .page_cache import listings_version
+
+
+# Read-only JSON for the mobile apps. Each resource has a fixed set of fields,
+# named here with the lookup that selects them; ?fields=a,b picks some of them,
+# and only those columns are read from the database.
+#
+# Responses carry an ETag built from a cheap version number of the resource
+# (the listings version, a listing's updated_at or its comment_version), so a
+# client that already has the current data gets a 304 without the main query
+# running. Usernames are not part of these versions: they can only be changed
+# in the admin, and until the resource next changes a client may be sent a
+# 304 for data showing the old username.
+
+LISTING_FIELDS = {
+    "id": "id",
+    "title": "title",
+    "description": "description",
+    "price": "price",
+    "category": "category",
+    "photo_url": "photo_url",
+    "lister": "lister__username",
+    "active": "active",
+    "date_created": "date_created",
+    "ends_at": "ends_at",
+    "bid_count": "bid_count",
+    "highest_bid": "highest_bid",
+    "highest_bidder": "highest_bidder__username",
+    "winner": "winner__username",
+}
+
+BID_SUMMARY_FIELDS = {
+    "id": "id",
+    "price": "price",
+    "active": "active",
+    "bid_count": "bid_count",
+    "highest_bid": "highest_bid",
+    "highest_bidder": "highest_bidder__username",
+}
+
+BID_FIELDS = {
+    "bidder": "bidder__username",
+    "amount": "bid",
+    "date": "date",
+}
+
+COMMENT_FIELDS = {
+    "id": "id",
+    "commenter": "commenter__username",
+    "comment": "comment",
+    "date": "date",
+}
+
+FEED_PAGE_SIZE = 24
+BID_HISTORY_PAGE_SIZE = 50
+MAX_TOP_BIDS = 50
+COMMENTS_PAGE_SIZE = 50
+
+
+def requested_fields(request, available):
+    """
+    The field names asked for in ?fields=, or all of available. Raises
+    ValueError naming any field that isn't available.
+    """
+    param = request.GET.get("fields", "")
+    if not param:
+        return list(available)
+    fields = [name.strip() for name in param.split(",") if name.strip()]
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(available)}.")
+    return fields
+
+
+def select(queryset, fields, available, extra=()):
+    # values() of just the columns behind fields, plus extra ones (such as the
+    # sort key that keyset pagination needs)
+    lookups = [available[name] for name in fields] + list(extra)
+    return queryset.values(*dict.fromkeys(lookups))
+
+
+def as_json(row, fields, available):
+    # A row from select() under the API's field names
+    return {name: row[available[name]] for name in fields}
+
+
+def make_etag(*parts):
+    return hashlib.md5(":".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _fields_are_valid(request, available):
+    # Responses to bad requests get no ETag
+    try:
+        requested_fields(request, available)
+    except ValueError:
+        return False
+    return True
+
+
+def feed_etag(request):
+    # No query at all: the listings version lives in the cache
+    if not _fields_are_valid(request, LISTING_FIELDS):
+        return None
+    return make_etag("feed", listings_version(), request.GET.get("after", ""), request.GET.get("fields", ""))
+
+
+def _listing_etag(resource, available):
+    def etag(request, listing_id):
+        if not _fields_are_valid(request, available):
+            return None
+        # Bids and closing set updated_at, so it versions a listing and its bids
+        updated_at = Listing.objects.filter(pk=listing_id).values_list("updated_at", flat=True).first()
+        if updated_at is None:
+            return None
+        return make_etag(resource, listing_id, updated_at.isoformat(), request.GET.urlencode())
+    return etag
+
+
+listing_etag = _listing_etag("listing", LISTING_FIELDS)
+bid_summary_etag = _listing_etag("bids", BID_SUMMARY_FIELDS)
+bid_ladder_etag = _listing_etag("bid-ladder", BID_FIELDS)
+
+
+def comments_etag(request, listing_id):
+    if not _fields_are_valid(request, COMMENT_FIELDS):
+        return None
+    # One row by primary key, however many comments the listing has
+    version = Listing.objects.filter(pk=listing_id).values_list("comment_version", flat=True).first()
+    if version is None:
+        return None
+    return make_etag("comments", listing_id, version, request.GET.get("after", ""), request.GET.get("fields", ""))
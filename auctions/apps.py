@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class AuctionsConfig(AppConfig):
     name = 'auctions'
+
+    def ready(self):
+        from . import signals, tasks
+
+        if getattr(settings, "AUCTIONS_PRECOMPILE_TEMPLATES", False):
+            from .template_loading import precompile_templates
+            precompile_templates()
@@ -0,0 +1,243 @@
+import base64
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .live import publish_listing_event
+from .page_cache import bump_listings_version
+from .models import Listing, Bid, ProxyBid
+
+
+# Bidding goes up by at least this much, depending on the amount being beaten:
+# (below this amount, the increment). Used when bidding for a maximum bid.
+BID_INCREMENTS = [
+    (Decimal("1"), Decimal("0.05")),
+    (Decimal("5"), Decimal("0.25")),
+    (Decimal("25"), Decimal("0.50")),
+    (Decimal("100"), Decimal("1.00")),
+    (Decimal("250"), Decimal("2.50")),
+    (Decimal("500"), Decimal("5.00")),
+    (Decimal("1000"), Decimal("10.00")),
+    (Decimal("2500"), Decimal("25.00")),
+    (Decimal("5000"), Decimal("50.00")),
+    (None, Decimal("100.00")),
+]
+
+
+def bid_increment(amount):
+    for below, increment in BID_INCREMENTS:
+        if below is None or amount < below:
+            return increment
+
+
+def _open_listings():
+    return Listing.objects.filter(Q(ends_at__isnull=True) | Q(ends_at__gt=timezone.now()), active=True)
+
+
+def place_bid(listing_id, bidder, amount):
+    """
+    Place a bid of amount on a listing. Returns True if the bid was accepted,
+    False if the listing is closed or past its end time, or the bid is not
+    higher than its price.
+
+    The listing's price always holds the highest bid, so the check and the raise
+    are done by one conditional UPDATE, which also maintains the listing's bid
+    statistics. The database only lets one bid through for a given price, and
+    the Bid row is written in the same transaction. Maximum bids above the new
+    price answer it in that transaction too, so the bidder may be outbid at once.
+    """
+    with transaction.atomic():
+        raised = _open_listings().filter(
+            pk=listing_id,
+            price__lt=amount,
+        ).update(price=amount,
+                 highest_bid=amount,
+                 highest_bidder=bidder,
+                 bid_count=F("bid_count") + 1,
+                 updated_at=timezone.now())
+
+        if not raised:
+            return False
+
+        Bid.objects.create(bidder=bidder, bid_for_id=listing_id, bid=amount)
+        resolve_proxy_bids(listing_id)
+        _publish_bid(listing_id)
+        return True
+
+
+def set_maximum_bid(listing_id, bidder, maximum):
+    """
+    Have bidder bid on a listing whenever they are outbid, as little as it takes
+    to lead, up to maximum. Returns True if the maximum was accepted, False if
+    the listing is closed or past its end time, or maximum is not higher than
+    its price and any maximum bidder already set on it.
+
+    Every maximum on the listing is settled in the same transaction, so a
+    bidding war between maximums takes one request instead of one per raise.
+    An earlier, higher maximum still outbids bidder straight away.
+    """
+    with transaction.atomic():
+        # Written before the listing is read, so that on SQLite the transaction
+        # holds the write lock from the start
+        raised = ProxyBid.objects.filter(
+            listing=listing_id, bidder=bidder, maximum__lt=maximum,
+        ).update(maximum=maximum, placed_at=timezone.now())
+        if not raised:
+            try:
+                with transaction.atomic():
+                    ProxyBid.objects.create(listing_id=listing_id, bidder=bidder, maximum=maximum)
+            except IntegrityError:
+                # They already have this maximum or a higher one
+                return False
+
+        if not _open_listings().filter(pk=listing_id, price__lt=maximum).exists():
+            transaction.set_rollback(True)
+            return False
+
+        if resolve_proxy_bids(listing_id):
+            _publish_bid(listing_id)
+        return True
+
+
+def resolve_proxy_bids(listing_id):
+    """
+    Bid for the maximum bids above a listing's price until one of them leads and
+    no other can outbid it, and record the outcome. Returns True if the price
+    changed. Must be called in a transaction.
+
+    Only two bids matter: the highest maximum wins (the one set first, on a tie)
+    and pays one increment over the second highest, or over the current price,
+    but never more than its maximum. The runner-up's maximum is recorded as
+    their last bid. Both are read from proxy_listing_maximum_idx, so this costs
+    the same however many maximums the listing has.
+    """
+    listing = Listing.objects.select_for_update().filter(pk=listing_id).values("price", "highest_bidder").get()
+    price, leader = listing["price"], listing["highest_bidder"]
+
+    contenders = list(ProxyBid.objects.filter(listing=listing_id, maximum__gt=price)
+                      .order_by("-maximum", "placed_at", "id")
+                      .values_list("bidder", "maximum")[:2])
+    if not contenders:
+        return False
+    if leader is not None and leader not in (bidder for bidder, _ in contenders):
+        # The leading bid stands at the price, below every maximum above it
+        contenders.append((leader, price))
+
+    winner, maximum = contenders[0]
+    if len(contenders) == 1:
+        # Opening the bidding
+        runner_up, runner_up_maximum = None, price
+    else:
+        runner_up, runner_up_maximum = contenders[1]
+    if winner == leader and runner_up is None:
+        return False
+    new_price = min(maximum, runner_up_maximum + bid_increment(runner_up_maximum))
+
+    bids = []
+    if price < runner_up_maximum < new_price:
+        bids.append(Bid(bidder_id=runner_up, bid_for_id=listing_id, bid=runner_up_maximum))
+    bids.append(Bid(bidder_id=winner, bid_for_id=listing_id, bid=new_price))
+    Bid.objects.bulk_create(bids)
+
+    Listing.objects.filter(pk=listing_id).update(price=new_price,
+                                                 highest_bid=new_price,
+                                                 highest_bidder=winner,
+                                                 bid_count=F("bid_count") + len(bids),
+                                                 updated_at=timezone.now())
+    # bulk_create() and update() send no post_save signals, so bump the page cache here
+    transaction.on_commit(bump_listings_version)
+    return True
+
+
+def _publish_bid(listing_id):
+    # Tell anyone following the listing, once the bid is committed
+    price, bid_count, bidder = Listing.objects.filter(pk=listing_id).values_list(
+        "price", "bid_count", "highest_bidder__username").get()
+    transaction.on_commit(lambda: publish_listing_event(
+        listing_id, "bid", price=str(price), bid_count=bid_count, bidder=bidder,
+    ))
+
+
+def rebuild_bid_stats(listings=None):
+    """
+    Recompute bid_count, highest_bid and highest_bidder from the Bid table for
+    the given listings (all listings by default), in one UPDATE statement.
+    Returns the number of listings updated.
+    """
+    if listings is None:
+        listings = Listing.objects.all()
+
+    bids = Bid.objects.filter(bid_for=OuterRef("pk"))
+    # The earliest bid wins a tie on the amount
+    top_bid = bids.order_by("-bid", "bid_id")
+    bid_count = bids.order_by().values("bid_for").annotate(count=Count("*")).values("count")
+
+    return listings.update(
+        bid_count=Coalesce(Subquery(bid_count), Value(0)),
+        highest_bid=Subquery(top_bid.values("bid")[:1]),
+        highest_bidder=Subquery(top_bid.values("bidder")[:1]),
+    )
+
+
+# The bid ladder: a listing's bids from the highest down. bid_listing_amount_idx
+# holds them in this order with every column shown, so reading the top of the
+# ladder costs the same on a listing with ten bids as on one with ten thousand.
+
+TOP_BIDS = 5
+
+
+def ladder(listing_id):
+    # Highest first, and the earliest of equal bids first, as in rebuild_bid_stats
+    return Bid.objects.filter(bid_for=listing_id).order_by("-bid", "bid_id")
+
+
+def top_bids(listing_id, n=TOP_BIDS):
+    return list(ladder(listing_id).select_related("bidder")[:n])
+
+
+async def atop_bids(listing_id, n=TOP_BIDS):
+    # top_bids() for async views
+    return [bid async for bid in ladder(listing_id).select_related("bidder")[:n]]
+
+
+def encode_ladder_cursor(amount, bid_id):
+    return base64.urlsafe_b64encode(f"{amount}|{bid_id}".encode()).decode()
+
+
+def decode_ladder_cursor(cursor):
+    # Returns (amount, bid_id), or None if the cursor is missing or garbled
+    if not cursor:
+        return None
+    try:
+        amount, bid_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        amount, bid_id = Decimal(amount), int(bid_id)
+    except (ValueError, UnicodeError, InvalidOperation):
+        return None
+    # Decimal() also reads "NaN" and "Infinity", which can't be compared with bids
+    if not amount.is_finite():
+        return None
+    return amount, bid_id
+
+
+def ladder_page(queryset, cursor, page_size):
+    """
+    Return (rows, next_cursor) for the page of queryset, a ladder() (or its
+    values() including "bid" and "bid_id"), below cursor.
+    """
+    position = decode_ladder_cursor(cursor)
+    if position is not None:
+        amount, bid_id = position
+        queryset = queryset.filter(Q(bid__lt=amount) | Q(bid=amount, bid_id__gt=bid_id))
+
+    # One extra row tells whether there is a next page
+    rows = list(queryset[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    if isinstance(last, dict):
+        return rows, encode_ladder_cursor(last["bid"], last["bid_id"])
+    return rows, encode_ladder_cursor(last.bid, last.bid_id)
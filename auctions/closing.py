@@ -0,0 +1,59 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import jobs
+from .facets import adjust_category_counts
+from .live import publish_listing_event
+from .page_cache import bump_listings_version
+from .models import Listing
+
+
+def close_listings(listing_ids):
+    """
+    Close the given listings and make each one's highest bidder its winner,
+    with a fixed number of queries however many listings there are. Listings
+    that are already closed are left alone. Returns the number closed.
+    """
+    with transaction.atomic():
+        listings = Listing.objects.filter(pk__in=listing_ids, active=True)
+
+        closing = {listing_id: (category, winner) for listing_id, category, winner
+                   in listings.values_list("id", "category", "highest_bidder")}
+        closed = listings.update(active=False, winner=F("highest_bidder"), updated_at=timezone.now())
+
+        # Winners and listers are emailed by the background worker
+        jobs.enqueue_many("winner_notice", [{"listing_id": listing_id}
+                                            for listing_id, (_, winner) in closing.items() if winner is not None])
+
+        per_category = Counter(category for category, _ in closing.values())
+        adjust_category_counts({category: -count for category, count in per_category.items()})
+
+        def announce():
+            # update() sends no post_save signals, so bump the page cache here
+            bump_listings_version()
+            for listing_id in closing:
+                publish_listing_event(listing_id, "closed")
+        transaction.on_commit(announce)
+    return closed
+
+
+def close_expired_listings(batch_size=500, now=None):
+    """
+    Close every active listing whose end time has passed, batch_size listings
+    per transaction so bids on other listings only wait for one batch at a
+    time. Returns the number of listings closed.
+    """
+    if now is None:
+        now = timezone.now()
+
+    total = 0
+    while True:
+        expired = list(Listing.objects.filter(active=True, ends_at__lte=now)
+                       .order_by("ends_at")
+                       .values_list("id", flat=True)[:batch_size])
+        if not expired:
+            return total
+        total += close_listings(expired)
@@ -0,0 +1,8 @@
+from .watchlist_counts import get_watchlist_count
+
+
+def watchlist_count(request):
+    # Number shown next to "Watchlist" in the navigation bar
+    if not request.user.is_authenticated:
+        return {}
+    return {"watchlist_count": get_watchlist_count(request.user)}
@@ -0,0 +1,67 @@
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+
+from .listing_categories import LISTING_CATEGORIES
+from .models import CategoryCount, Listing
+
+
+# The categories page shows how many active listings each category holds. The
+# numbers live in CategoryCount and are adjusted as listings open and close, so
+# showing them never needs a GROUP BY over the listings table. New and deleted
+# listings are counted by the signals in auctions.signals; closing a listing
+# has to call listing_closed() itself.
+
+def adjust_category_counts(changes):
+    """
+    Apply changes, a dict of {category: change in active listings}, to the
+    stored counts with one UPDATE per category.
+    """
+    for category, delta in changes.items():
+        if delta:
+            # Never below zero, even if a listing was closed twice somewhere
+            updated = CategoryCount.objects.filter(category=category).update(
+                active_listings=Greatest(F("active_listings") + delta, Value(0))
+            )
+            if not updated:
+                rebuild_category_counts([category])
+
+
+def listing_opened(category):
+    adjust_category_counts({category: 1})
+
+
+def listing_closed(category):
+    adjust_category_counts({category: -1})
+
+
+def rebuild_category_counts(categories=None):
+    # Count from scratch, for categories that have no row yet or after bulk edits
+    if categories is None:
+        categories = [category for category, name in LISTING_CATEGORIES]
+    counts = dict(Listing.objects.filter(active=True, category__in=categories)
+                  .values_list("category")
+                  .annotate(Count("id"))
+                  .order_by())
+    for category in categories:
+        CategoryCount.objects.update_or_create(
+            category=category,
+            defaults={"active_listings": counts.get(category, 0)},
+        )
+
+
+def category_facets():
+    """
+    Return [(category, name, active listings)] for every category, in the
+    order of LISTING_CATEGORIES, from a single query.
+    """
+    return _facets(CategoryCount.objects.values_list("category", "active_listings"))
+
+
+async def acategory_facets():
+    # category_facets() for async views
+    return _facets([row async for row in CategoryCount.objects.values_list("category", "active_listings")])
+
+
+def _facets(rows):
+    counts = dict(rows)
+    return [(category, name, counts.get(category, 0)) for category, name in LISTING_CATEGORIES]
@@ -4,6 +4,8 @@ from .listing_categories import LISTING_CATEGORIES
 
 class BidForm(forms.Form):
     bid = forms.DecimalField(required=True, max_digits=9, decimal_places=2)
+    maximum = forms.BooleanField(required=False,
+                                 label='Bid for me up to this amount')
     
 class ListingForm(forms.Form):
     title = forms.CharField(
@@ -31,6 +33,16 @@ class ListingForm(forms.Form):
                                required=True)
     
     category = forms.ChoiceField(choices=LISTING_CATEGORIES, initial='None')
+
+    duration = forms.TypedChoiceField(choices=[("", "No end date"),
+                                               (1, "1 day"),
+                                               (3, "3 days"),
+                                               (7, "7 days"),
+                                               (14, "14 days")],
+                                      coerce=int,
+                                      empty_value=None,
+                                      required=False,
+                                      label='Bidding ends after')
     
     photo_url = forms.URLField(label='',
                                required=False,
@@ -0,0 +1,173 @@
+import logging
+import traceback
+import uuid
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+
+# A job queue kept in the database, so that work beyond a request's own writes
+# (emails) runs after the response instead of during it.
+#
+# enqueue() is one INSERT, in the caller's transaction if there is one, so a
+# job is only ever run for writes that were committed. The run_jobs command
+# runs a Worker, which claims due jobs a batch at a time and runs their
+# handlers on a pool of threads. A failed job is retried after a delay that
+# doubles each time, until it has had its handler's max_attempts.
+
+# Tries before a job is given up on, unless its handler says otherwise
+MAX_ATTEMPTS = 5
+# Retry delays: RETRY_BASE_SECONDS, then twice that, and so on, up to RETRY_MAX_SECONDS
+RETRY_BASE_SECONDS = 10
+RETRY_MAX_SECONDS = 60 * 60
+# How long a worker has to finish the jobs it claims. The jobs of a worker that
+# dies are claimed again by another once this runs out.
+LEASE_SECONDS = 5 * 60
+
+logger = logging.getLogger(__name__)
+
+Handler = namedtuple("Handler", ["function", "batch", "max_attempts"])
+
+_handlers = {}
+
+
+def handler(name, batch=False, max_attempts=MAX_ATTEMPTS):
+    """
+    Register the decorated function as the handler of jobs called name. It is
+    called with a job's payload as keyword arguments or, if batch is True, once
+    with the list of payloads of every job called name in the worker's batch.
+    """
+    def register(function):
+        _handlers[name] = Handler(function, batch, max_attempts)
+        return function
+    return register
+
+
+def enqueue(name, delay=None, **payload):
+    """
+    Add a job to the queue, to run once the current transaction (if any)
+    commits, and after delay (a timedelta) if given. Returns the Job.
+    """
+    return Job.objects.create(name=_registered(name), payload=payload, run_at=_run_at(delay))
+
+
+def enqueue_many(name, payloads, delay=None):
+    # enqueue() for many jobs of the same kind, in one INSERT
+    name, run_at = _registered(name), _run_at(delay)
+    return Job.objects.bulk_create([Job(name=name, payload=payload, run_at=run_at) for payload in payloads])
+
+
+def _registered(name):
+    if name not in _handlers:
+        raise ValueError(f"No job handler called {name!r}.")
+    return name
+
+
+def _run_at(delay):
+    return timezone.now() + delay if delay else timezone.now()
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+def due_jobs(now=None):
+    # Served by job_due_idx, so finding work costs the same however long the queue is
+    return Job.objects.filter(failed_at__isnull=True, run_at__lte=now or timezone.now()).order_by("run_at")
+
+
+class Worker:
+    """
+    Runs due jobs: run_once() claims up to batch_size of them and runs them on
+    threads (in the calling thread if threads is 1).
+    """
+
+    def __init__(self, threads=4, batch_size=100):
+        self.batch_size = batch_size
+        self.threads = threads
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="jobs") if threads > 1 else None
+
+    def claim(self):
+        """
+        Take up to batch_size due jobs, so no other worker runs them until the
+        lease runs out. Returns the claimed jobs.
+        """
+        now = timezone.now()
+        token = uuid.uuid4().hex
+        ids = list(due_jobs(now).values_list("id", flat=True)[:self.batch_size])
+        if not ids:
+            return []
+        # Only the jobs still due: another worker may have claimed some since
+        Job.objects.filter(pk__in=ids, failed_at__isnull=True, run_at__lte=now).update(
+            run_at=now + timedelta(seconds=LEASE_SECONDS),
+            claimed_by=token,
+            attempts=F("attempts") + 1,
+        )
+        return list(Job.objects.filter(pk__in=ids, claimed_by=token).order_by("run_at", "id"))
+
+    def run_once(self):
+        # Claim a batch and run it. Returns the number of jobs run.
+        jobs = self.claim()
+        if not jobs:
+            return 0
+
+        # One call per job, or per name for batch handlers
+        calls = defaultdict(list)
+        for job in jobs:
+            job_handler = _handlers.get(job.name)
+            key = job.name if job_handler is not None and job_handler.batch else job.id
+            calls[key].append(job)
+
+        if self.pool is None:
+            outcomes = [self._call(group) for group in calls.values()]
+        else:
+            outcomes = list(self.pool.map(self._call, calls.values()))
+
+        done = []
+        for group, error in zip(calls.values(), outcomes):
+            if error is None:
+                done += [job.id for job in group]
+            else:
+                for job in group:
+                    self._failed(job, error)
+        Job.objects.filter(pk__in=done).delete()
+        return len(jobs)
+
+    def _call(self, group):
+        # Run the handler for a group of jobs. Returns None, or the error.
+        job_handler = _handlers.get(group[0].name)
+        if job_handler is None:
+            return f"No job handler called {group[0].name!r}."
+        try:
+            if job_handler.batch:
+                job_handler.function([job.payload for job in group])
+            else:
+                job_handler.function(**group[0].payload)
+        except Exception:
+            logger.exception("%s job(s) %s failed", group[0].name, ", ".join(str(job.id) for job in group))
+            return traceback.format_exc()
+        return None
+
+    def _failed(self, job, error):
+        job_handler = _handlers.get(job.name)
+        max_attempts = job_handler.max_attempts if job_handler is not None else 1
+        now = timezone.now()
+        if job.attempts >= max_attempts:
+            changes = {"failed_at": now}
+        else:
+            changes = {"run_at": now + retry_delay(job.attempts)}
+        Job.objects.filter(pk=job.pk).update(claimed_by="", last_error=error, **changes)
+
+    def close(self):
+        if self.pool is None:
+            return
+        # Each thread has its own database connection
+        for future in [self.pool.submit(connections.close_all) for _ in range(self.threads)]:
+            future.result()
+        self.pool.shutdown()
@@ -0,0 +1,109 @@
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+# Live listing updates. Code that changes a listing publishes an event on the
+# listing's channel, and every browser following the listing over the
+# listingEvents stream receives it, instead of reloading the page to find out.
+#
+# The broker is chosen by the AUCTIONS_LIVE_BROKER setting, so the in-process
+# broker below can be replaced by one that shares events between processes.
+
+def listing_channel(listing_id):
+    return f"listing:{listing_id}"
+
+
+class Subscription:
+    """
+    Events for one subscriber. Only the newest few events are kept: a client
+    that falls behind skips to the latest price instead of growing a backlog,
+    which keeps the memory per subscriber fixed.
+    """
+    MAX_PENDING = 8
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(self.MAX_PENDING)
+
+    def deliver(self, event):
+        # Called on the subscriber's event loop
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+class InProcessBroker:
+    """
+    Publish/subscribe between threads of one process. publish() may be called
+    from any thread (sync views run in a thread pool under ASGI); each event is
+    handed to its subscribers' event loops.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self.lock:
+            self.subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            channel = self.subscribers.get(subscription.channel)
+            if channel is not None:
+                channel.discard(subscription)
+                if not channel:
+                    del self.subscribers[subscription.channel]
+
+    def publish(self, channel, event):
+        with self.lock:
+            subscribers = list(self.subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The subscriber's event loop has shut down
+                self.unsubscribe(subscription)
+
+    def subscriber_count(self, channel=None):
+        with self.lock:
+            if channel is not None:
+                return len(self.subscribers.get(channel, ()))
+            return sum(len(subscribers) for subscribers in self.subscribers.values())
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            broker_class = getattr(settings, "AUCTIONS_LIVE_BROKER", "auctions.live.InProcessBroker")
+            _broker = import_string(broker_class)()
+        return _broker
+
+
+def publish_listing_event(listing_id, event_type, **data):
+    get_broker().publish(listing_channel(listing_id), {"type": event_type, "listing": listing_id, **data})
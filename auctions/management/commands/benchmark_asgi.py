@@ -0,0 +1,158 @@
+import asyncio
+import statistics
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+
+from auctions.models import Listing
+
+
+class Command(BaseCommand):
+    help = ("Load test the read-only pages with many slow clients at once, served the "
+            "way a threaded WSGI server does (a fixed pool of worker threads, each busy "
+            "until its client has read the response) and the way an ASGI server does "
+            "(one event loop). Reports latency, the most requests in flight at once, "
+            "peak threads and traced Python memory per in-flight request. Uses the "
+            "listings already in the database; run generate_data first.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=200, help="Requests started at once")
+        parser.add_argument("--workers", type=int, default=8, help="Threads in the WSGI pool")
+        parser.add_argument("--client-delay-ms", type=float, default=200,
+                            help="How long each client takes to read its response")
+
+    def handle(self, *args, **options):
+        listing_ids = list(Listing.objects.filter(active=True).order_by("-id").values_list("id", flat=True)[:50])
+        if not listing_ids:
+            raise CommandError("No active listings to request; run generate_data first.")
+        # Anonymous pages only: the index, the categories page and listing pages
+        paths = [reverse("index"), reverse("listingsByCategories") + "?category=TECH"]
+        paths += [reverse("listings", args=[listing_id]) for listing_id in listing_ids]
+        paths = [paths[i % len(paths)] for i in range(options["clients"])]
+
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            for label, serve in (("wsgi", self.serve_wsgi), ("asgi", self.serve_asgi)):
+                result = self.measure(serve, paths, options["workers"], options["client_delay_ms"] / 1000)
+                self.stdout.write(
+                    f"{label}: {result['seconds']:6.2f}s  {len(paths) / result['seconds']:7.1f} req/s  "
+                    f"p50 {result['p50_ms']:7.1f}ms  p95 {result['p95_ms']:7.1f}ms  "
+                    f"{result['max_in_flight']:4d} in flight  {result['peak_threads']:4d} threads  "
+                    f"{result['kib_per_request']:6.1f} KiB per in-flight request"
+                )
+
+    def measure(self, serve, paths, workers, delay):
+        state = {"in_flight": 0, "max_in_flight": 0, "latencies_ms": []}
+        lock = threading.Lock()
+
+        def started():
+            with lock:
+                state["in_flight"] += 1
+                state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+
+        def finished(start):
+            with lock:
+                state["in_flight"] -= 1
+                state["latencies_ms"].append((time.perf_counter() - start) * 1000)
+
+        # Count threads from another thread while the requests run
+        baseline_threads = threading.active_count()
+        peak_threads = [0]
+        stop = threading.Event()
+
+        def sample_threads():
+            while not stop.is_set():
+                peak_threads[0] = max(peak_threads[0], threading.active_count())
+                time.sleep(0.001)
+
+        sampler = threading.Thread(target=sample_threads)
+        sampler.start()
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            serve(paths, workers, delay, started, finished)
+        finally:
+            seconds = time.perf_counter() - start
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            stop.set()
+            sampler.join()
+
+        percentiles = statistics.quantiles(state["latencies_ms"], n=100, method="inclusive")
+        return {
+            "seconds": seconds,
+            "p50_ms": percentiles[49],
+            "p95_ms": percentiles[94],
+            "max_in_flight": state["max_in_flight"],
+            # Not counting the sampler
+            "peak_threads": max(peak_threads[0] - baseline_threads - 1, 0),
+            "kib_per_request": peak_bytes / state["max_in_flight"] / 1024,
+        }
+
+    def serve_wsgi(self, paths, workers, delay, started, finished):
+        handler = WSGIHandler()
+        factory = RequestFactory()
+
+        def respond(path, queued):
+            started()
+            path, _, query = path.partition("?")
+            response = handler(factory._base_environ(PATH_INFO=path, QUERY_STRING=query, REQUEST_METHOD="GET"),
+                               lambda status, headers: None)
+            # The worker stays busy while the client reads
+            for _ in response:
+                time.sleep(delay)
+            response.close()
+            finished(queued)
+
+        def close_connections():
+            connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(respond, path, time.perf_counter()) for path in paths]
+            for future in futures:
+                future.result()
+            # Each worker thread has its own database connection
+            for future in [pool.submit(close_connections) for _ in range(workers)]:
+                future.result()
+
+    def serve_asgi(self, paths, workers, delay, started, finished):
+        handler = ASGIHandler()
+
+        async def respond(path):
+            queued = time.perf_counter()
+            started()
+            path, _, query = path.partition("?")
+            scope = {
+                "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+                "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+                "query_string": query.encode(), "headers": [(b"host", b"testserver")],
+                "server": ("testserver", 80), "client": ("127.0.0.1", 0),
+            }
+            received = asyncio.Event()
+
+            async def receive():
+                if not received.is_set():
+                    received.set()
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                # The client never disconnects early
+                await asyncio.Future()
+
+            async def send(message):
+                # Only this coroutine waits while the client reads
+                if message["type"] == "http.response.body":
+                    await asyncio.sleep(delay)
+
+            await handler(scope, receive, send)
+            finished(queued)
+
+        async def run():
+            await asyncio.gather(*(respond(path) for path in paths))
+
+        asyncio.run(run())
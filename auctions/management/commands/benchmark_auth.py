@@ -0,0 +1,84 @@
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from auctions.bidding import place_bid
+from auctions.models import Comment, Listing, User, Watchlist
+
+
+# Sessions and users loaded from the database on every request, as Django does
+# by default, and from the cache (the settings in commerce/settings.py)
+CONFIGURATIONS = {
+    "database": {
+        "SESSION_ENGINE": "django.contrib.sessions.backends.db",
+        "AUTHENTICATION_BACKENDS": ["django.contrib.auth.backends.ModelBackend"],
+    },
+    "cached": {
+        "SESSION_ENGINE": "django.contrib.sessions.backends.cached_db",
+        "AUTHENTICATION_BACKENDS": ["auctions.user_cache.CachedModelBackend"],
+    },
+}
+
+
+class Command(BaseCommand):
+    help = ("Measure the queries and time per signed-in page view with sessions and "
+            "users loaded from the database and from the cache. Uses a synthetic user "
+            "and listing created in a transaction that is rolled back afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Requests per page")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user, listing = self.populate()
+            pages = {
+                "index": reverse("index"),
+                "listings": reverse("listings", args=[listing.id]),
+                "watchlist": reverse("watchlist"),
+            }
+            results = {name: self.measure(user, pages, options["requests"], settings)
+                       for name, settings in CONFIGURATIONS.items()}
+            for page in pages:
+                database, cached = results["database"][page], results["cached"][page]
+                self.stdout.write(
+                    f"{page:>10}: database {database['queries']:4.1f} queries {database['ms']:6.2f}ms   "
+                    f"cached {cached['queries']:4.1f} queries {cached['ms']:6.2f}ms   "
+                    f"saved {database['queries'] - cached['queries']:4.1f} queries "
+                    f"{database['ms'] - cached['ms']:5.2f}ms per view"
+                )
+            # Nothing measured is kept
+            transaction.set_rollback(True)
+
+    def populate(self):
+        user = User.objects.create_user("benchmark-auth", "benchmark-auth@example.com", "password")
+        lister = User.objects.create(username="benchmark-auth-lister")
+        listing = Listing.objects.create(title="Benchmark", price=Decimal("10.00"), lister=lister)
+        Watchlist.objects.create(watched_by=user, listing=listing)
+        Comment.objects.create(commenter=lister, comment_for=listing, comment="Any questions?")
+        place_bid(listing.id, user, Decimal("11.00"))
+        return user, listing
+
+    def measure(self, user, pages, requests, settings):
+        results = {}
+        # The test client sends requests for "testserver"
+        with override_settings(ALLOWED_HOSTS=["testserver"], **settings):
+            client = Client()
+            client.force_login(user)
+            for page, url in pages.items():
+                # The first request fills the caches
+                client.get(url)
+                timings, queries = [], []
+                for _ in range(requests):
+                    with CaptureQueriesContext(connection) as captured:
+                        start = time.perf_counter()
+                        client.get(url)
+                        timings.append((time.perf_counter() - start) * 1000)
+                    queries.append(len(captured))
+                results[page] = {"ms": statistics.median(timings), "queries": statistics.mean(queries)}
+        return results
@@ -0,0 +1,62 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from auctions.listing_categories import LISTING_CATEGORIES
+from auctions.models import User, Listing
+from auctions.page_cache import bump_listings_version, page_cache_stats
+
+
+class Command(BaseCommand):
+    help = ("Measure anonymous requests per second to the index and categories pages "
+            "with the page cache cold and warm. Uses synthetic listings created in a "
+            "transaction that is rolled back afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=500)
+        parser.add_argument("--requests", type=int, default=300)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.populate(options["listings"])
+            client = Client()
+            pages = [reverse("index")] + [
+                f"{reverse('listingsByCategories')}?category={category}"
+                for category, name in LISTING_CATEGORIES
+            ]
+            for url in pages[:2]:
+                # The test client sends requests for "testserver"
+                with override_settings(ALLOWED_HOSTS=["testserver"]):
+                    cold = self.rate(client, url, options["requests"], cold=True)
+                    warm = self.rate(client, url, options["requests"], cold=False)
+                self.stdout.write(f"{url:>45}: cold {cold:8.0f} req/s   warm {warm:8.0f} req/s   "
+                                  f"({warm / cold:.1f}x)")
+            self.stdout.write(f"Cache {page_cache_stats()}")
+            # Nothing measured is kept
+            transaction.set_rollback(True)
+
+    def populate(self, count):
+        rng = random.Random(11)
+        lister = User.objects.create(username="benchmark-page-cache-lister")
+        Listing.objects.bulk_create(
+            Listing(title=f"Listing {i}",
+                    description="A fine item in good condition. " * rng.randint(1, 5),
+                    category=rng.choice(LISTING_CATEGORIES)[0],
+                    lister=lister)
+            for i in range(count)
+        )
+        bump_listings_version()
+
+    def rate(self, client, url, requests, cold):
+        client.get(url)
+        start = time.perf_counter()
+        for _ in range(requests):
+            if cold:
+                # A new version makes every request miss, as if the data just changed
+                bump_listings_version()
+            client.get(url)
+        return requests / (time.perf_counter() - start)
@@ -0,0 +1,80 @@
+import itertools
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from auctions.models import User, Listing
+from auctions.search import search_listings
+
+
+SYLLABLES = "ba be bi bo bu ka ke ki ko ku la le li lo lu ma me mi mo mu ra re ri ro ru ta te ti to tu".split()
+
+
+def make_vocabulary(rng, size):
+    # Made-up words, so each search term only matches a small share of listings
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+class Command(BaseCommand):
+    help = ("Compare full-text search against a LIKE scan on a synthetic set of listings. "
+            "The listings are created in a transaction that is rolled back afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listings", type=int, default=100_000)
+        parser.add_argument("--repeat", type=int, default=20,
+                            help="Times to run each query")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            vocabulary = self.populate(options["listings"])
+            # A common word, a less common one, a rare one, two words together
+            # and a word no listing has
+            for text in (vocabulary[20], vocabulary[500], vocabulary[15_000],
+                         f"{vocabulary[50]} {vocabulary[60]}", "zeppelin"):
+                self.compare(text, options["repeat"])
+            # Nothing measured is kept
+            transaction.set_rollback(True)
+
+    def populate(self, count):
+        rng = random.Random(50)
+        vocabulary = make_vocabulary(rng, 20_000)
+        # Skewed word frequencies, like real text: early words are much more common
+        cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+        lister = User.objects.create(username="benchmark-search-lister")
+        start = time.perf_counter()
+        Listing.objects.bulk_create((
+            Listing(title=" ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=3)),
+                    description=" ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=30)),
+                    lister=lister)
+            for _ in range(count)
+        ), batch_size=5000)
+        self.stdout.write(f"Created {count} listings in {time.perf_counter() - start:.2f}s")
+        return vocabulary
+
+    def compare(self, text, repeat):
+        def like_scan():
+            # What a naive search box would do: scan every row
+            matches = Q()
+            for word in text.split():
+                matches &= Q(title__icontains=word) | Q(description__icontains=word)
+            return list(Listing.objects.filter(matches)[:24])
+
+        def full_text():
+            return search_listings(text)[0]
+
+        like = self.time(like_scan, repeat)
+        fts = self.time(full_text, repeat)
+        self.stdout.write(f"{text!r:>24}: LIKE {like * 1000:8.2f}ms   FTS5 {fts * 1000:8.2f}ms   "
+                          f"(FTS5 {like / fts:.2f}x as fast)")
+
+    def time(self, query, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            query()
+        return (time.perf_counter() - start) / repeat
@@ -0,0 +1,119 @@
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from auctions.sqlite_tuning import TUNED_PRAGMAS, apply_pragmas
+
+
+SCHEMA = """
+    CREATE TABLE listing (id INTEGER PRIMARY KEY, title TEXT, price REAL, bid_count INTEGER, active INTEGER);
+    CREATE TABLE bid (id INTEGER PRIMARY KEY, listing_id INTEGER, bid REAL);
+    CREATE INDEX bid_listing ON bid (listing_id);
+"""
+
+
+class Command(BaseCommand):
+    help = ("Run reader and writer threads against a scratch SQLite database, once with "
+            "SQLite's defaults and once with the AUCTIONS_SQLITE_TUNING pragmas, and "
+            "compare throughput, write latency and \"database is locked\" errors.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=5)
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--writers", type=int, default=4)
+        parser.add_argument("--listings", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        for label, pragmas in (("default", {}), ("tuned", TUNED_PRAGMAS)):
+            result = self.run(pragmas, options)
+            self.stdout.write(
+                f"{label:>8}: {result['reads'] / options['seconds']:9.0f} reads/s  "
+                f"{result['writes'] / options['seconds']:7.0f} writes/s  "
+                f"write p99 {result['write_p99_ms']:7.1f}ms  "
+                f"{result['locked']} locked errors"
+            )
+
+    def run(self, pragmas, options):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "benchmark.sqlite3")
+        setup = sqlite3.connect(path)
+        setup.executescript(SCHEMA)
+        setup.executemany("INSERT INTO listing VALUES (?, ?, 10, 0, 1)",
+                          ((i, f"Listing {i}") for i in range(1, options["listings"] + 1)))
+        setup.commit()
+        setup.close()
+
+        stop = threading.Event()
+        lock = threading.Lock()
+        result = {"reads": 0, "writes": 0, "locked": 0, "write_ms": []}
+
+        def connect():
+            # Autocommit, with explicit BEGIN like Django's atomic()
+            connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+            apply_pragmas(connection.cursor(), pragmas)
+            return connection
+
+        def reader(seed):
+            rng = random.Random(seed)
+            connection = connect()
+            reads = locked = 0
+            while not stop.is_set():
+                try:
+                    connection.execute("SELECT * FROM listing WHERE active = 1 AND id > ? ORDER BY id LIMIT 24",
+                                       (rng.randrange(options["listings"]),)).fetchall()
+                    reads += 1
+                except sqlite3.OperationalError:
+                    locked += 1
+            connection.close()
+            with lock:
+                result["reads"] += reads
+                result["locked"] += locked
+
+        def writer(seed):
+            rng = random.Random(seed)
+            connection = connect()
+            writes = locked = 0
+            timings = []
+            while not stop.is_set():
+                listing_id = rng.randrange(1, options["listings"] + 1)
+                start = time.perf_counter()
+                try:
+                    connection.execute("BEGIN")
+                    connection.execute("UPDATE listing SET price = price + 1, bid_count = bid_count + 1 "
+                                       "WHERE id = ?", (listing_id,))
+                    connection.execute("INSERT INTO bid (listing_id, bid) VALUES (?, 1)", (listing_id,))
+                    connection.execute("COMMIT")
+                    writes += 1
+                    timings.append((time.perf_counter() - start) * 1000)
+                except sqlite3.OperationalError:
+                    locked += 1
+                    if connection.in_transaction:
+                        connection.execute("ROLLBACK")
+            connection.close()
+            with lock:
+                result["writes"] += writes
+                result["locked"] += locked
+                result["write_ms"] += timings
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(options["readers"])]
+        threads += [threading.Thread(target=writer, args=(i,)) for i in range(options["writers"])]
+        for thread in threads:
+            thread.start()
+        time.sleep(options["seconds"])
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+        timings = result.pop("write_ms")
+        result["write_p99_ms"] = statistics.quantiles(timings, n=100)[98] if len(timings) > 1 else 0.0
+        return result
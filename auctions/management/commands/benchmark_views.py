@@ -0,0 +1,175 @@
+import json
+import statistics
+import time
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from auctions.models import Listing
+from auctions.synthetic import SYNTHETIC_PASSWORD, generate
+from auctions.urls import urlpatterns
+
+
+# Ten listings for importListings
+IMPORT_CSV = "title,price,category\n" + "".join(f"Imported {i},10,TECH\n" for i in range(10))
+
+# Views that can't be timed as a single request/response
+SKIPPED = {
+    "listingEvents": "streams events until the listing closes",
+    "thumbnail": "serves files made from remote photos by the thumbnail workers",
+}
+
+
+class Command(BaseCommand):
+    help = ("Time every route in auctions/urls.py against synthetic data and report latency "
+            "percentiles and query counts. The data is created in a transaction that is "
+            "rolled back afterwards. With --baseline, fail if any view got slower than the "
+            "threshold allows or runs more queries than before.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50, help="Requests per route")
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--listings", type=int, default=1000)
+        parser.add_argument("--bids", type=int, default=5000)
+        parser.add_argument("--comments", type=int, default=2000)
+        parser.add_argument("--watchlist", type=int, default=1000)
+        parser.add_argument("--save", metavar="PATH", help="Write the results to PATH as JSON")
+        parser.add_argument("--baseline", metavar="PATH", help="Compare against results saved with --save")
+        parser.add_argument("--threshold", type=float, default=1.25,
+                            help="Largest allowed ratio of p95 latency to the baseline's")
+        parser.add_argument("--min-delta-ms", type=float, default=1.0,
+                            help="Ignore p95 changes smaller than this, which are mostly noise")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = generate(users=options["users"],
+                             listings=options["listings"],
+                             bids=options["bids"],
+                             comments=options["comments"],
+                             watchlist=options["watchlist"])
+            # The test client sends requests for "testserver"
+            with override_settings(ALLOWED_HOSTS=["testserver"]):
+                results = self.run(users, options["requests"])
+            # Nothing measured is kept
+            transaction.set_rollback(True)
+
+        self.report(results)
+        if options["save"]:
+            with open(options["save"], "w") as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+        if options["baseline"]:
+            self.compare(results, options["baseline"], options["threshold"], options["min_delta_ms"])
+
+    def run(self, users, requests):
+        staff, lister, bidder = users[0], users[1], users[2]
+        staff.is_staff = True
+        staff.save()
+
+        # closeListing needs a fresh listing for every request
+        Listing.objects.bulk_create(Listing(title=f"To close {i}", lister=lister) for i in range(requests))
+        own_listings = list(Listing.objects.filter(lister=lister, title__startswith="To close ")
+                            .values_list("id", flat=True))
+        others = list(Listing.objects.exclude(lister=bidder).filter(active=True).values_list("id", flat=True)[:requests])
+
+        # Each scenario returns (client, method, path, data) for request number i
+        clients = {"anonymous": Client()}
+        for name, user in (("staff", staff), ("lister", lister), ("bidder", bidder)):
+            clients[name] = Client()
+            clients[name].force_login(user)
+
+        def listing(i):
+            return others[i % len(others)]
+
+        scenarios = {
+            "index": lambda i: ("anonymous", "get", reverse("index"), None),
+            "watchlist": lambda i: ("bidder", "get", reverse("watchlist"), None),
+            "toggleWatchlist": lambda i: ("bidder", "post", reverse("toggleWatchlist"),
+                                          {"listing_id": listing(i)}),
+            "createComment": lambda i: ("bidder", "post", reverse("createComment"),
+                                        {"listing_id": listing(i), "comment": f"Benchmark comment {i}"}),
+            "createListing": lambda i: ("lister", "post", reverse("createListing"),
+                                        {"title": f"Benchmark {i}", "price": "10", "category": "TECH"}),
+            "listings": lambda i: ("bidder", "get", reverse("listings", args=[listing(i)]), None),
+            "listingComments": lambda i: ("anonymous", "get", reverse("listingComments", args=[listing(i)]), None),
+            "listingsByCategories": lambda i: ("anonymous", "get", reverse("listingsByCategories") + "?category=TECH", None),
+            "search": lambda i: ("anonymous", "get", reverse("search") + "?q=walnut+desk", None),
+            "closeListing": lambda i: ("lister", "get", reverse("closeListing", args=[own_listings[i]]), None),
+            "login": lambda i: ("anonymous", "post", reverse("login"),
+                                {"username": bidder.username, "password": SYNTHETIC_PASSWORD}),
+            "logout": lambda i: ("anonymous", "get", reverse("logout"), None),
+            "register": lambda i: ("anonymous", "post", reverse("register"), {
+                "username": f"benchmark-{i}", "email": f"benchmark-{i}@example.com",
+                "password": "password", "confirmation": "password"}),
+            "metrics": lambda i: ("staff", "get", reverse("metrics"), None),
+            "importListings": lambda i: ("staff", "post", reverse("importListings"), {
+                "file": SimpleUploadedFile("listings.csv", IMPORT_CSV.encode(), "text/csv")}),
+            "exportListings": lambda i: ("staff", "get", reverse("exportListings"), None),
+            "apiListings": lambda i: ("anonymous", "get", reverse("apiListings"), None),
+            "apiListing": lambda i: ("anonymous", "get", reverse("apiListing", args=[listing(i)]), None),
+            "apiBidSummary": lambda i: ("anonymous", "get", reverse("apiBidSummary", args=[listing(i)]), None),
+            "apiBidHistory": lambda i: ("anonymous", "get", reverse("apiBidHistory", args=[listing(i)]), None),
+            "apiTopBids": lambda i: ("anonymous", "get", reverse("apiTopBids", args=[listing(i)]), None),
+            "apiComments": lambda i: ("anonymous", "get", reverse("apiComments", args=[listing(i)]), None),
+        }
+
+        missing = {pattern.name for pattern in urlpatterns} - set(scenarios) - set(SKIPPED)
+        if missing:
+            raise CommandError(f"No benchmark scenario for: {', '.join(sorted(missing))}")
+
+        results = {}
+        for name, scenario in scenarios.items():
+            timings, queries = [], []
+            for i in range(requests):
+                client, method, path, data = scenario(i)
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    response = getattr(clients[client], method)(path, data)
+                    if response.streaming:
+                        b"".join(response.streaming_content)
+                    timings.append((time.perf_counter() - start) * 1000)
+                if response.status_code >= 400:
+                    raise CommandError(f"{name}: {method.upper()} {path} returned {response.status_code}")
+                queries.append(len(captured))
+                if name == "login":
+                    clients["anonymous"].logout()
+
+            percentiles = statistics.quantiles(timings, n=100, method="inclusive")
+            results[name] = {
+                "p50_ms": round(percentiles[49], 3),
+                "p95_ms": round(percentiles[94], 3),
+                "p99_ms": round(percentiles[98], 3),
+                "mean_queries": round(statistics.mean(queries), 2),
+                "max_queries": max(queries),
+            }
+        return results
+
+    def report(self, results):
+        self.stdout.write(f"{'view':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>10}")
+        for name, result in results.items():
+            self.stdout.write(f"{name:<22}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+                              f"{result['p99_ms']:>10.2f}{result['mean_queries']:>10.1f}")
+        for name, reason in SKIPPED.items():
+            self.stdout.write(f"{name:<22}skipped: {reason}")
+
+    def compare(self, results, baseline_path, threshold, min_delta_ms):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+        regressions = []
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            slower = result["p95_ms"] - before["p95_ms"]
+            if result["p95_ms"] > before["p95_ms"] * threshold and slower > min_delta_ms:
+                regressions.append(f"{name}: p95 {before['p95_ms']:.2f}ms -> {result['p95_ms']:.2f}ms")
+            if result["max_queries"] > before["max_queries"]:
+                regressions.append(f"{name}: queries {before['max_queries']} -> {result['max_queries']}")
+
+        if regressions:
+            raise CommandError("Slower than the baseline:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"No view regressed past {threshold}x the baseline."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions import thumbnails
+from auctions.models import Listing
+
+
+class Command(BaseCommand):
+    help = ("Make the thumbnails of every active listing's photo that doesn't have them "
+            "yet, using the thumbnail worker pool, and wait for them. Pages request "
+            "missing thumbnails by themselves; this fills the cache ahead of time.")
+
+    def handle(self, *args, **options):
+        if not thumbnails.available():
+            raise CommandError("Thumbnails need Pillow (pip install Pillow).")
+
+        urls = (Listing.objects.filter(active=True).exclude(photo_url="")
+                .values_list("photo_url", flat=True).distinct().iterator())
+        futures = [thumbnails.request_thumbnails(url) for url in urls if not thumbnails.has_thumbnails(url)]
+        made = sum(1 for future in futures if future.result() is not None)
+        self.stdout.write(f"Thumbnailed {made} of {len(futures)} photo(s).")
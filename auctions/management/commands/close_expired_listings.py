@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from auctions.closing import close_expired_listings
+
+
+class Command(BaseCommand):
+    help = "Close listings whose end time has passed and record their winners."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500,
+                            help="Listings closed per transaction")
+        parser.add_argument("--every", type=int, metavar="SECONDS",
+                            help="Keep running, checking for expired listings every SECONDS")
+
+    def handle(self, *args, **options):
+        while True:
+            closed = close_expired_listings(batch_size=options["batch_size"])
+            self.stdout.write(f"Closed {closed} expired listing(s).")
+
+            if not options["every"]:
+                return
+            time.sleep(options["every"])
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from auctions.synthetic import SYNTHETIC_PASSWORD, generate
+
+
+class Command(BaseCommand):
+    help = "Fill the database with synthetic users, listings, bids, comments and watchlist entries."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--listings", type=int, default=1000)
+        parser.add_argument("--bids", type=int, default=5000)
+        parser.add_argument("--comments", type=int, default=2000)
+        parser.add_argument("--watchlist", type=int, default=1000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        users = generate(users=options["users"],
+                         listings=options["listings"],
+                         bids=options["bids"],
+                         comments=options["comments"],
+                         watchlist=options["watchlist"],
+                         seed=options["seed"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(users)} users (password {SYNTHETIC_PASSWORD!r}), e.g. {users[0].username}."
+        ))
@@ -0,0 +1,41 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from auctions.bulk_listings import FORMATS, READ_ERRORS, format_for, import_listings, read_rows
+from auctions.models import User
+
+
+class Command(BaseCommand):
+    help = ("Create listings from a CSV or JSON lines file (\"-\" for standard input), "
+            "with the columns title, description, price, category, duration and "
+            "photo_url. Rows are checked like the create listing form; invalid ones "
+            "are skipped and reported.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--lister", required=True, help="Username of the listings' owner")
+        parser.add_argument("--format", choices=FORMATS,
+                            help="Defaults to the file's extension, or csv")
+        parser.add_argument("--batch-size", type=int, default=500,
+                            help="Listings created per query")
+
+    def handle(self, *args, **options):
+        try:
+            lister = User.objects.get(username=options["lister"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['lister']!r}.")
+
+        format = options["format"] or format_for(options["path"])
+        try:
+            if options["path"] == "-":
+                result = import_listings(read_rows(sys.stdin, format), lister, options["batch_size"])
+            else:
+                with open(options["path"], newline="", encoding="utf-8") as f:
+                    result = import_listings(read_rows(f, format), lister, options["batch_size"])
+        except READ_ERRORS as error:
+            raise CommandError(f"Couldn't read {options['path']}: {error}")
+
+        for error in result["errors"]:
+            self.stderr.write(f"Line {error['line']}: {error['error']}")
+        self.stdout.write(f"Created {result['created']} listing(s), rejected {result['rejected']}.")
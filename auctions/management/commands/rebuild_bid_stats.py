@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from auctions.bidding import rebuild_bid_stats
+from auctions.models import Listing
+
+
+class Command(BaseCommand):
+    help = "Recompute the bid statistics stored on each listing from the Bid table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("listing_ids", nargs="*", type=int,
+                            help="Only rebuild these listings (default: all)")
+
+    def handle(self, *args, **options):
+        listings = Listing.objects.all()
+        if options["listing_ids"]:
+            listings = listings.filter(pk__in=options["listing_ids"])
+
+        updated = rebuild_bid_stats(listings)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt bid statistics for {updated} listing(s)."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from auctions.facets import rebuild_category_counts
+
+
+class Command(BaseCommand):
+    help = "Recount the active listings in each category shown on the categories page."
+
+    def handle(self, *args, **options):
+        rebuild_category_counts()
+        self.stdout.write(self.style.SUCCESS("Rebuilt category counts."))
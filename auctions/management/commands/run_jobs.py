@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from auctions.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = ("Run background jobs (outbid alerts, winner and comment notices) as "
+            "they become due, on a pool of threads.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=4, help="Jobs run at once")
+        parser.add_argument("--batch-size", type=int, default=100, help="Jobs claimed at a time")
+        parser.add_argument("--poll-interval", type=float, default=1.0, metavar="SECONDS",
+                            help="How long to wait when there are no due jobs")
+        parser.add_argument("--once", action="store_true",
+                            help="Run the jobs that are due now, then stop")
+
+    def handle(self, *args, **options):
+        worker = Worker(threads=options["threads"], batch_size=options["batch_size"])
+        total = 0
+        try:
+            while True:
+                ran = worker.run_once()
+                total += ran
+                if ran:
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            worker.close()
+        self.stdout.write(f"Ran {total} job(s).")
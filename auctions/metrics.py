@@ -0,0 +1,168 @@
+import contextvars
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+
+# Per-view request metrics, kept in memory by this process: wall time, number
+# of SQL queries, time spent in SQL and response size, recorded under the URL
+# name the request resolved to. Staff can read them from the metrics view.
+#
+# AUCTIONS_METRICS_SAMPLE_RATE (0 to 1) sets the share of requests measured;
+# requests that are not sampled only cost one random() call.
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf"))
+
+
+class ViewMetrics:
+
+    def __init__(self):
+        self.requests = 0
+        self.wall_ms = 0.0
+        self.max_wall_ms = 0.0
+        self.queries = 0
+        self.max_queries = 0
+        self.sql_ms = 0.0
+        self.response_bytes = 0
+        self.latency_histogram = [0] * len(LATENCY_BUCKETS_MS)
+
+    def record(self, wall_ms, queries, sql_ms, response_bytes):
+        self.requests += 1
+        self.wall_ms += wall_ms
+        self.max_wall_ms = max(self.max_wall_ms, wall_ms)
+        self.queries += queries
+        self.max_queries = max(self.max_queries, queries)
+        self.sql_ms += sql_ms
+        self.response_bytes += response_bytes
+        self.latency_histogram[bisect_left(LATENCY_BUCKETS_MS, wall_ms)] += 1
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "mean_wall_ms": self.wall_ms / self.requests,
+            "max_wall_ms": self.max_wall_ms,
+            "mean_queries": self.queries / self.requests,
+            "max_queries": self.max_queries,
+            "mean_sql_ms": self.sql_ms / self.requests,
+            "mean_response_bytes": self.response_bytes / self.requests,
+            "latency_histogram_ms": {
+                str(bound): count for bound, count in zip(LATENCY_BUCKETS_MS, self.latency_histogram)
+            },
+        }
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def record(self, view_name, wall_ms, queries, sql_ms, response_bytes):
+        with self.lock:
+            if view_name not in self.views:
+                self.views[view_name] = ViewMetrics()
+            self.views[view_name].record(wall_ms, queries, sql_ms, response_bytes)
+
+    def snapshot(self):
+        with self.lock:
+            return {name: metrics.as_dict() for name, metrics in sorted(self.views.items())}
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+
+
+registry = MetricsRegistry()
+
+
+class QueryTimer:
+    # Counts and times the queries of one request
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+# The timer of the request being measured. A context variable rather than a
+# wrapper on this thread's connections, because the async ORM runs queries on
+# another thread with its own connection, and asgiref carries the context there.
+_current_timer = contextvars.ContextVar("request_metrics_timer", default=None)
+
+
+def time_query(execute, sql, params, many, context):
+    # Installed on every connection by install_query_timer()
+    timer = _current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.seconds += time.perf_counter() - start
+        timer.queries += 1
+
+
+def install_query_timer(connection):
+    # Called by auctions.signals for each new database connection
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "AUCTIONS_METRICS_SAMPLE_RATE", 1.0)
+        self.async_mode = iscoroutinefunction(self.get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with self.timing_queries(timer):
+            response = self.get_response(request)
+        self.record(request, response, start, timer)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with self.timing_queries(timer):
+            response = await self.get_response(request)
+        self.record(request, response, start, timer)
+        return response
+
+    def sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    @contextmanager
+    def timing_queries(self, timer):
+        token = _current_timer.set(timer)
+        try:
+            yield
+        finally:
+            _current_timer.reset(token)
+
+    def record(self, request, response, start, timer):
+        wall_ms = (time.perf_counter() - start) * 1000
+        match = request.resolver_match
+        view_name = match.view_name if match else "unresolved"
+        # The size of a streamed response isn't known until it has been sent
+        size = 0 if response.streaming else len(response.content)
+        registry.record(view_name, wall_ms, timer.queries, timer.seconds * 1000, size)
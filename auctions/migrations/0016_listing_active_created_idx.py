@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0015_comment_date'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['active', 'date_created'], name='listing_active_created_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def compute_existing_bid_stats(apps, schema_editor):
+    # As auctions.bidding.rebuild_bid_stats, with the historical models
+    Listing = apps.get_model('auctions', 'Listing')
+    Bid = apps.get_model('auctions', 'Bid')
+    bids = Bid.objects.filter(bid_for=OuterRef('pk'))
+    top_bid = bids.order_by('-bid', 'bid_id')
+    bid_count = bids.order_by().values('bid_for').annotate(count=Count('*')).values('count')
+    Listing.objects.update(
+        bid_count=Coalesce(Subquery(bid_count), Value(0)),
+        highest_bid=Subquery(top_bid.values('bid')[:1]),
+        highest_bidder=Subquery(top_bid.values('bidder')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0016_listing_active_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='bid_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='highest_bid',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='highest_bidder',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='highest_bids', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(compute_existing_bid_stats, migrations.RunPython.noop),
+    ]
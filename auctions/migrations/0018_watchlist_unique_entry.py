@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:40
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_entries(apps, schema_editor):
+    # Double clicks on "Watch" used to save the same entry more than once.
+    # Keep the oldest row of each (watched_by, listing) pair.
+    Watchlist = apps.get_model('auctions', 'Watchlist')
+    keep = (Watchlist.objects.values('watched_by', 'listing')
+            .annotate(first_id=Min('id'))
+            .values('first_id'))
+    Watchlist.objects.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0017_listing_bid_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_entries, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='watchlist',
+            constraint=models.UniqueConstraint(fields=('watched_by', 'listing'), name='unique_watchlist_entry'),
+        ),
+    ]
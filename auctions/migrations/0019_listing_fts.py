@@ -0,0 +1,66 @@
+from django.db import migrations
+
+
+# Full-text index over listing titles and descriptions. It is an "external
+# content" FTS5 table: it stores only the index and reads the text from
+# auctions_listing, and the triggers below keep it in step with that table.
+CREATE_TABLE = [
+    """
+    CREATE VIRTUAL TABLE auctions_listing_fts USING fts5(
+        title,
+        description,
+        content='auctions_listing',
+        content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+]
+
+# SQLite drops these whenever a migration rebuilds auctions_listing, so such
+# migrations must create them again (see 0022_listing_updated_at).
+CREATE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS auctions_listing_fts_insert AFTER INSERT ON auctions_listing BEGIN
+        INSERT INTO auctions_listing_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS auctions_listing_fts_delete AFTER DELETE ON auctions_listing BEGIN
+        INSERT INTO auctions_listing_fts(auctions_listing_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    # Only title and description changes touch the index, not every bid
+    """
+    CREATE TRIGGER IF NOT EXISTS auctions_listing_fts_update AFTER UPDATE OF title, description ON auctions_listing BEGIN
+        INSERT INTO auctions_listing_fts(auctions_listing_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO auctions_listing_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+# Index the listings that already exist
+REBUILD_INDEX = ["INSERT INTO auctions_listing_fts(auctions_listing_fts) VALUES ('rebuild')"]
+
+CREATE_FTS = CREATE_TABLE + CREATE_TRIGGERS + REBUILD_INDEX
+
+DROP_FTS = [
+    "DROP TRIGGER IF EXISTS auctions_listing_fts_update",
+    "DROP TRIGGER IF EXISTS auctions_listing_fts_delete",
+    "DROP TRIGGER IF EXISTS auctions_listing_fts_insert",
+    "DROP TABLE IF EXISTS auctions_listing_fts",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0018_watchlist_unique_entry'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_FTS, DROP_FTS),
+    ]
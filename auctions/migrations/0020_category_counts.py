@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:44
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_existing_listings(apps, schema_editor):
+    Listing = apps.get_model('auctions', 'Listing')
+    CategoryCount = apps.get_model('auctions', 'CategoryCount')
+    counts = dict(Listing.objects.filter(active=True)
+                  .values_list('category')
+                  .annotate(Count('id'))
+                  .order_by())
+    CategoryCount.objects.bulk_create([
+        CategoryCount(category=category, active_listings=counts.get(category, 0))
+        for category, name in CategoryCount._meta.get_field('category').choices
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0019_listing_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryCount',
+            fields=[
+                ('category', models.CharField(choices=[('NONE', 'None'), ('FASHION', 'Fashion'), ('TOOLS', 'Tools'), ('TECH', 'Tech'), ('APPLIANCES', 'Appliances'), ('FURNITURE', 'Furniture'), ('TOYS', 'Toys'), ('VEHICLES', 'Vehicles'), ('REAL_ESTATE', 'Real Estate')], max_length=12, primary_key=True, serialize=False)),
+                ('active_listings', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['category', 'active'], name='listing_category_active_idx'),
+        ),
+        migrations.RunPython(count_existing_listings, migrations.RunPython.noop),
+    ]
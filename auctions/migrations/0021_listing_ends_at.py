@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0020_category_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['active', 'ends_at'], name='listing_active_ends_idx'),
+        ),
+    ]
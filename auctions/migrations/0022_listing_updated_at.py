@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:52
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# Adding the column makes SQLite rebuild auctions_listing, which drops the
+# full-text search triggers, so they are created again afterwards (and after
+# the rebuild when migrating backwards).
+listing_fts = import_module('auctions.migrations.0019_listing_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0021_listing_ends_at'),
+    ]
+
+    operations = [
+        migrations.RunSQL(migrations.RunSQL.noop, listing_fts.CREATE_TRIGGERS),
+        migrations.AddField(
+            model_name='listing',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunSQL(listing_fts.CREATE_TRIGGERS, migrations.RunSQL.noop),
+    ]
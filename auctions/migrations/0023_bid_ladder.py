@@ -0,0 +1,24 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0022_listing_updated_at'),
+    ]
+
+    operations = [
+        # Bids placed before this have no recorded time; they get the time of
+        # the migration
+        migrations.AddField(
+            model_name='bid',
+            name='date',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['bid_for', '-bid', 'bid_id', 'bidder', 'date'], name='bid_listing_amount_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0024_comment_listing_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProxyBid',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('maximum', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('placed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('bidder', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proxy_bids', to='auctions.listing')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['listing', '-maximum', 'placed_at'], name='proxy_listing_maximum_idx')],
+                'constraints': [models.UniqueConstraint(fields=('bidder', 'listing'), name='unique_proxy_bid')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:02
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# Rebuilds auctions_listing, so the full-text search triggers are created
+# again, as in 0022_listing_updated_at.
+listing_fts = import_module('auctions.migrations.0019_listing_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auctions', '0026_job'),
+    ]
+
+    operations = [
+        migrations.RunSQL(migrations.RunSQL.noop, listing_fts.CREATE_TRIGGERS),
+        migrations.AddField(
+            model_name='listing',
+            name='comment_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(listing_fts.CREATE_TRIGGERS, migrations.RunSQL.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 from .listing_categories import LISTING_CATEGORIES
 
 # One Model per SQL Table
@@ -25,12 +26,42 @@ class Listing(models.Model):
                                blank=True, 
                                related_name='winner')
     date_created = models.DateTimeField(auto_now_add=True)
+    # Changes whenever anything shown on the listing's card changes. Code that
+    # uses update() instead of save() must set it too.
+    updated_at = models.DateTimeField(auto_now=True)
+    # When bidding stops. Listings without one stay open until the lister closes them.
+    ends_at = models.DateTimeField(null=True, blank=True)
     active = models.BooleanField(default=True)
     
     category = models.CharField(choices=LISTING_CATEGORIES,
                                 max_length=12,
                                 default="NONE")
 
+    # Bid statistics, kept up to date by auctions.bidding in the same transaction as
+    # each new Bid so pages never have to count or sort the Bid table.
+    bid_count = models.PositiveIntegerField(default=0)
+    highest_bid = models.DecimalField(decimal_places=2, max_digits=10, null=True, blank=True)
+    highest_bidder = models.ForeignKey(User,
+                                       on_delete=models.SET_NULL,
+                                       null=True,
+                                       blank=True,
+                                       related_name='highest_bids')
+    # Raised whenever one of the listing's comments is saved or deleted (see
+    # auctions.signals), so the comments API can tell they changed without
+    # counting them.
+    comment_version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Serves the active listings feed, which is paged by (date_created, id).
+            # SQLite stores the rowid (id) in every index entry, so id comes for free.
+            models.Index(fields=["active", "date_created"], name="listing_active_created_idx"),
+            # Serves the listings by category page
+            models.Index(fields=["category", "active"], name="listing_category_active_idx"),
+            # Finds the listings that are due to close
+            models.Index(fields=["active", "ends_at"], name="listing_active_ends_idx"),
+        ]
+
     def __str__(self):
         return f"'{self.title}' created by {self.lister}"
  
@@ -40,15 +71,53 @@ class Bid(models.Model):
     bidder = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
     bid_for = models.ForeignKey(Listing, on_delete=models.CASCADE)
     bid = models.DecimalField(decimal_places=2, max_digits=10)
+    date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # A listing's bids from the highest, the earliest first on a tie.
+            # bidder and date are part of the key so that the bid ladder is
+            # read from the index alone (SQLite has no INCLUDE columns).
+            models.Index(fields=["bid_for", "-bid", "bid_id", "bidder", "date"],
+                         name="bid_listing_amount_idx"),
+        ]
     
     def __str__(self):
         return f"{self.bid} for {self.bid_for} placed by {self.bidder}"
 
+class ProxyBid(models.Model):
+    # The most a bidder will pay for a listing. auctions.bidding bids for them,
+    # as little as it takes to lead, up to this amount.
+    id = models.BigAutoField(primary_key=True)
+    bidder = models.ForeignKey(User, on_delete=models.CASCADE)
+    listing = models.ForeignKey(Listing, related_name="proxy_bids", on_delete=models.CASCADE)
+    maximum = models.DecimalField(decimal_places=2, max_digits=10)
+    # Of two equal maximums, the one set first wins
+    placed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["bidder", "listing"], name="unique_proxy_bid"),
+        ]
+        indexes = [
+            # The highest maximums on a listing, which are all that bidding reads
+            models.Index(fields=["listing", "-maximum", "placed_at"], name="proxy_listing_maximum_idx"),
+        ]
+
+    def __str__(self):
+        return f"Up to {self.maximum} for {self.listing} by {self.bidder}"
+
+
 class Watchlist(models.Model):
     id = models.BigAutoField(primary_key=True)
     watched_by = models.ForeignKey(User, on_delete=models.CASCADE)
     listing = models.ForeignKey(Listing, related_name="listing", on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["watched_by", "listing"], name="unique_watchlist_entry"),
+        ]
+
     def __str__(self):
         return f"'{self.listing}' watched by {self.watched_by}"
 
@@ -62,5 +131,50 @@ class Comment(models.Model) :
                                max_length=500)
     date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # A listing's comments in page order. SQLite ends every index with
+            # the row id, so this also covers the (date, id) keyset.
+            models.Index(fields=["comment_for", "date"], name="comment_listing_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"Comment for {self.comment_for}"
+
+
+class CategoryCount(models.Model):
+    # Number of active listings in each category, shown on the categories page.
+    # Kept up to date by auctions.facets as listings are created and closed.
+    category = models.CharField(choices=LISTING_CATEGORIES,
+                                max_length=12,
+                                primary_key=True)
+    active_listings = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.active_listings} active listing(s) in {self.category}"
+
+
+class Job(models.Model):
+    # Work for the background worker (see auctions/jobs.py). A job is deleted
+    # once it has run; one that keeps failing is kept, with failed_at set.
+    id = models.BigAutoField(primary_key=True)
+    name = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    # When the job may next run. Claiming a job moves this past the worker's
+    # lease, and a failure moves it past the retry delay.
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claimed_by = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+    failed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # The jobs that are due, in order. Failed jobs are left out, so
+            # they don't slow down claiming however many pile up.
+            models.Index(fields=["run_at"], name="job_due_idx", condition=models.Q(failed_at__isnull=True)),
+        ]
+
     def __str__(self):
-        return f"Comment for {self.comment_for}"
\ No newline at end of file
+        return f"{self.name} job {self.id}"
@@ -0,0 +1,111 @@
+import threading
+from functools import wraps
+from urllib.parse import urlencode
+
+from asgiref.sync import iscoroutinefunction
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .replicas import read_from_primary
+
+
+# Anonymous visitors all get the same listings pages, so those are cached as
+# whole responses. Keys include a global "listings version" that is bumped
+# whenever a listing or bid changes (see auctions.signals), so a cached page is
+# never stale: after a change, the next request simply looks for a new key.
+# Pages are rendered for the cache from the primary database, not a replica
+# that may not have seen the change yet.
+
+VERSION_KEY = "listings_version"
+# Only used to clear out pages for old versions
+PAGE_TIMEOUT = 60 * 60 * 24
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def listings_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # add() so that two processes starting at once agree on the version
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def bump_listings_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Not set yet, so nothing has been cached under it
+        pass
+
+
+def page_cache_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _count(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def cache_anonymous_page(*params):
+    """
+    Cache the view's response for anonymous GET requests. params are the query
+    parameters the page depends on; any others are left out of the key so they
+    can't fill the cache with copies of the same page. Works on sync and async
+    views.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method != "GET" or (await request.auser()).is_authenticated:
+                    return await view(request, *args, **kwargs)
+
+                key = _page_key(view, params, request)
+                response = _cached_page(key)
+                if response is None:
+                    read_from_primary()
+                    response = await view(request, *args, **kwargs)
+                    _store_page(key, response)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != "GET" or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+
+            key = _page_key(view, params, request)
+            response = _cached_page(key)
+            if response is None:
+                read_from_primary()
+                response = view(request, *args, **kwargs)
+                _store_page(key, response)
+            return response
+        return wrapper
+    return decorator
+
+
+def _page_key(view, params, request):
+    values = urlencode({param: request.GET.get(param, "") for param in params})
+    return f"page:{view.__name__}:{listings_version()}:{values}"
+
+
+def _cached_page(key):
+    # The cached response, or None (counted as a miss) if there isn't one
+    cached = cache.get(key)
+    if cached is None:
+        _count("misses")
+        return None
+    _count("hits")
+    content, content_type = cached
+    return HttpResponse(content, content_type=content_type)
+
+
+def _store_page(key, response):
+    if response.status_code == 200:
+        cache.set(key, (response.content, response["Content-Type"]), PAGE_TIMEOUT)
@@ -0,0 +1,66 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+# Keyset ("cursor") pagination. Instead of OFFSET, which makes the database walk
+# every skipped row, each page remembers the sort key of its last row and the
+# next page starts right after it. Fetching page 1000 costs the same as page 1.
+
+def encode_cursor(timestamp, pk):
+    raw = f"{timestamp.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    # Returns (timestamp, pk), or None if the cursor is missing or garbled
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp, pk = raw.split("|")
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (ValueError, UnicodeError):
+        return None
+
+
+def keyset_page(queryset, cursor, page_size, date_field="date_created"):
+    """
+    Return (items, next_cursor) for the page of queryset after cursor, ordered
+    by (date_field, id). next_cursor is None on the last page.
+    """
+    # Fetch one extra row to find out whether there is a next page
+    items = list(_after_cursor(queryset, cursor, date_field)[:page_size + 1])
+    return _split_page(items, page_size, date_field)
+
+
+async def akeyset_page(queryset, cursor, page_size, date_field="date_created"):
+    # keyset_page() for async views
+    items = [item async for item in _after_cursor(queryset, cursor, date_field)[:page_size + 1]]
+    return _split_page(items, page_size, date_field)
+
+
+def _after_cursor(queryset, cursor, date_field):
+    queryset = queryset.order_by(date_field, "id")
+
+    position = decode_cursor(cursor)
+    if position is not None:
+        timestamp, pk = position
+        queryset = queryset.filter(
+            Q(**{f"{date_field}__gt": timestamp}) |
+            Q(**{date_field: timestamp, "id__gt": pk})
+        )
+    return queryset
+
+
+def _split_page(items, page_size, date_field):
+    if len(items) <= page_size:
+        return items, None
+
+    items = items[:page_size]
+    last = items[-1]
+    if isinstance(last, dict):
+        # Rows from values()
+        return items, encode_cursor(last[date_field], last["id"])
+    return items, encode_cursor(getattr(last, date_field), last.pk)
@@ -0,0 +1,117 @@
+import contextvars
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+
+# Read replicas. Views marked with @reads_from_replica send their reads to one
+# of the database aliases in AUCTIONS_DATABASE_REPLICAS, so browsing doesn't
+# compete with bids for the primary ("default"). Everything else, and every
+# write, uses the primary.
+#
+# Replicas lag behind the primary, so users must still see their own changes:
+# once a request writes, the rest of it reads from the primary, and so do that
+# user's requests for the next AUCTIONS_REPLICA_PIN_SECONDS (via a cookie).
+# Pages for the page cache are rendered from the primary too (see
+# read_from_primary()), as a page from a replica that hadn't caught up would
+# be served to everyone until the next change.
+
+PIN_COOKIE = "primary_until"
+
+
+class RequestState:
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.replica = None
+        self.wrote = False
+
+
+_request_state = contextvars.ContextVar("replica_request_state", default=None)
+
+
+def reads_from_replica(view):
+    # Mark a view whose GET requests only read, and so may use a replica
+    view.reads_from_replica = True
+    return view
+
+
+def read_from_primary():
+    # Send the rest of the current request's reads to the primary
+    state = _request_state.get()
+    if state is not None:
+        state.pinned = True
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state is None or state.pinned or state.replica is None:
+            return "default"
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+            state.pinned = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(self.get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.finish(state, response)
+
+    async def __acall__(self, request):
+        state, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.finish(state, response)
+
+    def start(self, request):
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        state = RequestState(pinned)
+        return state, _request_state.set(state)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # The state object is shared, so this works even when Django runs this
+        # method in another thread or context
+        state = _request_state.get()
+        replicas = getattr(settings, "AUCTIONS_DATABASE_REPLICAS", [])
+        if (state is not None and replicas and request.method in ("GET", "HEAD")
+                and getattr(view_func, "reads_from_replica", False)):
+            state.replica = random.choice(replicas)
+
+    def finish(self, state, response):
+        if state.wrote:
+            pin_seconds = getattr(settings, "AUCTIONS_REPLICA_PIN_SECONDS", 5)
+            response.set_cookie(PIN_COOKIE, str(time.time() + pin_seconds),
+                                max_age=pin_seconds, httponly=True, samesite="Lax")
+        return response
@@ -0,0 +1,52 @@
+import re
+
+from .models import Listing
+
+
+SEARCH_WORD = re.compile(r"\w+")
+
+
+def fts_query(text):
+    """
+    Turn what the user typed into an FTS5 query. Every word is quoted so FTS5
+    operators in the input are matched literally, and the last word matches as
+    a prefix so partly typed words still find results.
+    """
+    words = SEARCH_WORD.findall(text)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_listings(text, category=None, active=None, page=1, per_page=24):
+    """
+    Return (listings, has_next) for one page of listings matching text, best
+    matches (lowest bm25) first. category and active narrow the results when
+    they are not None.
+    """
+    match = fts_query(text)
+    if match is None:
+        return [], False
+
+    sql = """
+        SELECT auctions_listing.*
+        FROM auctions_listing_fts
+        JOIN auctions_listing ON auctions_listing.id = auctions_listing_fts.rowid
+        WHERE auctions_listing_fts MATCH %s
+    """
+    params = [match]
+    if category is not None:
+        sql += " AND auctions_listing.category = %s"
+        params.append(category)
+    if active is not None:
+        sql += " AND auctions_listing.active = %s"
+        params.append(active)
+    # A match in the title counts for more than one in the description
+    sql += " ORDER BY bm25(auctions_listing_fts, 10.0, 1.0) LIMIT %s OFFSET %s"
+    # One extra row tells us whether there is a next page
+    params += [per_page + 1, (page - 1) * per_page]
+
+    listings = list(Listing.objects.raw(sql, params))
+    return listings[:per_page], len(listings) > per_page
@@ -0,0 +1,73 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import thumbnails
+from .models import Bid, Comment, Listing, User, Watchlist
+from .page_cache import bump_listings_version
+from .metrics import install_query_timer
+from .sqlite_tuning import tune_sqlite_connection
+from .user_cache import forget_user
+from .facets import listing_closed, listing_opened
+from .watchlist_counts import adjust_watchlist_count
+
+
+@receiver(pre_delete, sender=Listing)
+def forget_deleted_watchlist_entries(sender, instance, **kwargs):
+    # Deleting a listing cascades to its watchlist rows, so everyone watching it
+    # has one fewer listing in their watchlist.
+    for user_id in Watchlist.objects.filter(listing=instance).values_list("watched_by", flat=True):
+        adjust_watchlist_count(user_id, -1)
+
+
+@receiver(post_save, sender=Listing)
+def count_new_listing(sender, instance, created, **kwargs):
+    if created and instance.active:
+        listing_opened(instance.category)
+
+
+@receiver(post_save, sender=Listing)
+def thumbnail_new_listing(sender, instance, created, **kwargs):
+    # Have the thumbnails ready before the listing is first shown
+    if created and instance.photo_url and thumbnails.available():
+        transaction.on_commit(lambda: thumbnails.request_thumbnails(instance.photo_url))
+
+
+@receiver(post_delete, sender=Listing)
+def uncount_deleted_listing(sender, instance, **kwargs):
+    if instance.active:
+        listing_closed(instance.category)
+
+
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+@receiver(post_save, sender=Bid)
+@receiver(post_delete, sender=Bid)
+def invalidate_cached_pages(sender, **kwargs):
+    # Not before the commit: a page rendered in between would still show the
+    # old data but be cached under the new version.
+    transaction.on_commit(bump_listings_version)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comment_version(sender, instance, **kwargs):
+    # Versions the comments API's ETag (see auctions.api.comments_etag)
+    Listing.objects.filter(pk=instance.comment_for_id).update(comment_version=F("comment_version") + 1)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Now, and again after the commit in case a request in between cached the
+    # old row
+    forget_user(instance.pk)
+    transaction.on_commit(lambda: forget_user(instance.pk))
+
+
+@receiver(connection_created)
+def tune_new_connection(sender, connection, **kwargs):
+    tune_sqlite_connection(connection)
+    install_query_timer(connection)
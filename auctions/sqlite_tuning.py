@@ -0,0 +1,30 @@
+from django.conf import settings
+
+
+# SQLite settings for serving many requests at once, applied to each new
+# connection when AUCTIONS_SQLITE_TUNING is on (see commerce/settings_production.py).
+TUNED_PRAGMAS = {
+    # Readers no longer block the writer, and the writer no longer blocks readers
+    "journal_mode": "WAL",
+    # In WAL mode this only risks the last transactions on power loss, not corruption
+    "synchronous": "NORMAL",
+    # Read the database through a 256 MiB memory map instead of read() calls
+    "mmap_size": 256 * 1024 * 1024,
+    # Keep up to 64 MiB of pages in memory (negative values are KiB)
+    "cache_size": -64 * 1024,
+    # Wait up to 5 seconds for a lock instead of failing with "database is locked"
+    "busy_timeout": 5000,
+}
+
+
+def apply_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def tune_sqlite_connection(connection):
+    # Called for every new database connection, from auctions.signals
+    if connection.vendor != "sqlite" or not getattr(settings, "AUCTIONS_SQLITE_TUNING", False):
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, TUNED_PRAGMAS)
@@ -0,0 +1,85 @@
+import random
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import F
+
+from .bidding import rebuild_bid_stats
+from .facets import rebuild_category_counts
+from .listing_categories import LISTING_CATEGORIES
+from .models import User, Listing, Bid, Comment, Watchlist
+from .page_cache import bump_listings_version
+
+
+# Synthetic data for benchmarks and trying the site out at scale. Rows are
+# written with bulk_create, which skips save() and signals, so the derived data
+# (bid statistics, category counts, cached pages) is rebuilt at the end.
+
+SYNTHETIC_PASSWORD = "synthetic-password"
+
+WORDS = ("vintage lamp oak table chair leather jacket bike road mountain drill cordless "
+         "hammer sofa velvet lego castle truck diesel camera lens guitar acoustic watch "
+         "steel ring silver desk walnut kettle copper").split()
+
+
+def generate(users=100, listings=1000, bids=5000, comments=2000, watchlist=1000, seed=0, batch_size=1000):
+    """
+    Create the given numbers of users, listings, bids, comments and watchlist
+    entries. Every user's password is SYNTHETIC_PASSWORD. seed decides the rows'
+    contents; usernames are unique to each run, so it can be run again on a
+    database that already has synthetic data. Returns the new users.
+    """
+    rng = random.Random(seed)
+    prefix = f"synthetic-{uuid.uuid4().hex[:8]}"
+    # Hashing is slow on purpose, so hash once and share it
+    password = make_password(SYNTHETIC_PASSWORD)
+
+    with transaction.atomic():
+        User.objects.bulk_create((
+            User(username=f"{prefix}-{i}", email=f"{prefix}-{i}@example.com", password=password)
+            for i in range(users)
+        ), batch_size=batch_size)
+        new_users = list(User.objects.filter(username__startswith=f"{prefix}-").order_by("id"))
+
+        Listing.objects.bulk_create((
+            Listing(title=" ".join(rng.sample(WORDS, 3)).capitalize(),
+                    description=" ".join(rng.choices(WORDS, k=rng.randint(5, 40))),
+                    price=Decimal(rng.randint(1, 500)),
+                    category=rng.choice(LISTING_CATEGORIES)[0],
+                    lister=rng.choice(new_users))
+            for _ in range(listings)
+        ), batch_size=batch_size)
+        new_listings = list(Listing.objects.filter(lister__in=new_users).values_list("id", "price"))
+
+        # Bids on each listing rise from its starting price
+        next_bid = {listing_id: price for listing_id, price in new_listings}
+        bid_rows = []
+        for _ in range(bids):
+            listing_id = rng.choice(new_listings)[0]
+            next_bid[listing_id] += Decimal(rng.randint(1, 20))
+            bid_rows.append(Bid(bidder=rng.choice(new_users), bid_for_id=listing_id, bid=next_bid[listing_id]))
+        Bid.objects.bulk_create(bid_rows, batch_size=batch_size)
+
+        Comment.objects.bulk_create((
+            Comment(comment=" ".join(rng.choices(WORDS, k=rng.randint(3, 20))),
+                    commenter=rng.choice(new_users),
+                    comment_for_id=rng.choice(new_listings)[0])
+            for _ in range(comments)
+        ), batch_size=batch_size)
+
+        # Duplicate pairs are dropped by the unique constraint
+        Watchlist.objects.bulk_create((
+            Watchlist(watched_by=rng.choice(new_users), listing_id=rng.choice(new_listings)[0])
+            for _ in range(watchlist)
+        ), batch_size=batch_size, ignore_conflicts=True)
+
+        listing_rows = Listing.objects.filter(lister__in=new_users)
+        rebuild_bid_stats(listing_rows)
+        # A listing's price is its highest bid
+        listing_rows.filter(highest_bid__isnull=False).update(price=F("highest_bid"))
+        rebuild_category_counts()
+
+    bump_listings_version()
+    return new_users
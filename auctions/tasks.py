@@ -0,0 +1,60 @@
+from django.core.mail import send_mass_mail
+
+from .jobs import handler
+from .models import Comment, Listing, User
+
+
+# What the background worker does (see auctions/jobs.py). Notices are batch
+# handlers, so a batch of them goes out over one mail server connection.
+
+
+@handler("outbid_alert", batch=True)
+def send_outbid_alerts(payloads):
+    # payloads: {"listing_id", "user_id"} of bidders who lost the lead
+    listings = Listing.objects.in_bulk({payload["listing_id"] for payload in payloads})
+    users = User.objects.in_bulk({payload["user_id"] for payload in payloads})
+    messages = []
+    for payload in payloads:
+        listing, user = listings.get(payload["listing_id"]), users.get(payload["user_id"])
+        if listing is None or user is None or not user.email or listing.highest_bidder_id == user.id:
+            continue
+        messages.append((f"You have been outbid on {listing.title}",
+                         f"The highest bid on {listing.title} is now ${listing.price}.",
+                         None, [user.email]))
+    send_mass_mail(messages)
+
+
+@handler("winner_notice", batch=True)
+def send_winner_notices(payloads):
+    # payloads: {"listing_id"} of closed listings; the winner and lister are told
+    listings = Listing.objects.select_related("winner", "lister").in_bulk(
+        {payload["listing_id"] for payload in payloads})
+    messages = []
+    for listing in listings.values():
+        if listing.winner is None:
+            continue
+        if listing.winner.email:
+            messages.append((f"You won {listing.title}",
+                             f"Your bid of ${listing.price} won {listing.title}.",
+                             None, [listing.winner.email]))
+        if listing.lister.email:
+            messages.append((f"{listing.title} has been sold",
+                             f"{listing.winner.username} won {listing.title} for ${listing.price}.",
+                             None, [listing.lister.email]))
+    send_mass_mail(messages)
+
+
+@handler("comment_notice", batch=True)
+def send_comment_notices(payloads):
+    # payloads: {"comment_id"}; the lister hears about comments by others
+    comments = Comment.objects.select_related("commenter", "comment_for__lister").in_bulk(
+        {payload["comment_id"] for payload in payloads})
+    messages = []
+    for comment in comments.values():
+        lister = comment.comment_for.lister
+        if lister == comment.commenter or not lister.email:
+            continue
+        messages.append((f"New comment on {comment.comment_for.title}",
+                         f"{comment.commenter.username} wrote: {comment.comment}",
+                         None, [lister.email]))
+    send_mass_mail(messages)
@@ -0,0 +1,31 @@
+import os
+
+from django.template import engines
+
+
+def template_names(loader):
+    # Every template a filesystem-style loader can find, as names for get_template()
+    for directory in loader.get_dirs():
+        for root, dirs, files in os.walk(directory):
+            for name in files:
+                if name.endswith(".html"):
+                    yield os.path.relpath(os.path.join(root, name), directory).replace(os.sep, "/")
+
+
+def precompile_templates():
+    """
+    Load every template through each engine's cached loader, so they are parsed
+    once at startup rather than on the first request that renders them.
+    Returns the number of templates compiled.
+    """
+    compiled = 0
+    for backend in engines.all():
+        engine = getattr(backend, "engine", None)
+        if engine is None:
+            continue
+        for loader in engine.template_loaders:
+            for source_loader in getattr(loader, "loaders", [loader]):
+                for name in template_names(source_loader):
+                    engine.get_template(name)
+                    compiled += 1
+    return compiled
@@ -0,0 +1,12 @@
+from django import template
+
+from .. import thumbnails
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail_url(source_url, size):
+    # {% thumbnail_url listing.photo_url "card" as src %}: see auctions/thumbnails.py
+    return thumbnails.thumbnail_url(source_url, size)
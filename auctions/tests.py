@@ -1,3 +1,1817 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from decimal import Decimal
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .bidding import (TOP_BIDS, bid_increment, decode_ladder_cursor, encode_ladder_cursor, ladder, place_bid,
+                      resolve_proxy_bids, set_maximum_bid, top_bids)
+from .bulk_listings import export_rows, import_listings, read_rows
+from .closing import close_expired_listings, close_listings
+from .facets import category_facets, rebuild_category_counts
+from .metrics import registry as metrics_registry
+from .synthetic import generate
+from . import jobs, thumbnails
+from .page_cache import listings_version, page_cache_stats
+from .template_loading import precompile_templates
+from .live import InProcessBroker, Subscription, get_broker, publish_listing_event
+from .models import User, Listing, Bid, CategoryCount, Comment, Job, ProxyBid, Watchlist
+from .pagination import decode_cursor, encode_cursor, keyset_page
+from .search import fts_query, search_listings
+from .user_cache import CachedModelBackend
+from .watchlist_counts import COUNT_TIMEOUT, get_watchlist_count
+from .views import MAX_SEARCH_PAGE
+
+
+class IndexPaginationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user("seller", "seller@example.com", "password")
+        Listing.objects.bulk_create([
+            Listing(title=f"Item {i}", lister=self.user) for i in range(30)
+        ])
+        cache.clear()
+
+    def test_pages_cover_every_active_listing_once(self):
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = keyset_page(Listing.objects.filter(active=True), cursor, 7)
+            seen.extend(listing.id for listing in page)
+            if cursor is None:
+                break
+        self.assertEqual(seen, list(Listing.objects.order_by("date_created", "id").values_list("id", flat=True)))
+
+    def test_same_timestamp_is_split_by_id(self):
+        # bulk_create can give several rows the same date_created
+        first = Listing.objects.order_by("date_created", "id")[0]
+        Listing.objects.update(date_created=first.date_created)
+        page, cursor = keyset_page(Listing.objects.all(), None, 10)
+        next_page, _ = keyset_page(Listing.objects.all(), cursor, 10)
+        self.assertEqual(next_page[0].id, page[-1].id + 1)
+
+    def test_index_renders_next_page_link(self):
+        response = self.client.get(reverse("index"))
+        self.assertEqual(len(response.context["listings"]), 24)
+        self.assertIsNotNone(response.context["next_cursor"])
+
+        response = self.client.get(reverse("index"), {"after": response.context["next_cursor"]})
+        self.assertEqual(len(response.context["listings"]), 6)
+        self.assertIsNone(response.context["next_cursor"])
+
+    def test_bad_cursor_starts_from_first_page(self):
+        self.assertIsNone(decode_cursor("not-a-cursor"))
+        response = self.client.get(reverse("index"), {"after": "not-a-cursor"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_cursor_round_trip(self):
+        listing = Listing.objects.first()
+        cursor = encode_cursor(listing.date_created, listing.id)
+        self.assertEqual(decode_cursor(cursor), (listing.date_created, listing.id))
+
+
+class PlaceBidTests(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        self.listing = Listing.objects.create(title="Lamp", price=Decimal("10.00"), lister=self.seller)
+
+    def test_higher_bid_raises_price(self):
+        self.assertTrue(place_bid(self.listing.id, self.bidder, Decimal("12.00")))
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.price, Decimal("12.00"))
+        self.assertEqual(Bid.objects.get().bid, Decimal("12.00"))
+
+    def test_accepted_bid_updates_bid_stats(self):
+        other = User.objects.create_user("other", "other@example.com", "password")
+        place_bid(self.listing.id, self.bidder, Decimal("11.00"))
+        place_bid(self.listing.id, other, Decimal("13.00"))
+        place_bid(self.listing.id, self.bidder, Decimal("12.00"))
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.bid_count, 2)
+        self.assertEqual(self.listing.highest_bid, Decimal("13.00"))
+        self.assertEqual(self.listing.highest_bidder, other)
+
+    def test_bid_not_above_price_is_rejected(self):
+        self.assertFalse(place_bid(self.listing.id, self.bidder, Decimal("10.00")))
+        self.assertFalse(Bid.objects.exists())
+
+    def test_closed_listing_rejects_bids(self):
+        Listing.objects.filter(pk=self.listing.id).update(active=False)
+        self.assertFalse(place_bid(self.listing.id, self.bidder, Decimal("50.00")))
+        self.assertFalse(Bid.objects.exists())
+
+    def test_ended_listing_rejects_bids(self):
+        Listing.objects.filter(pk=self.listing.id).update(ends_at=timezone.now() - timedelta(minutes=1))
+        self.assertFalse(place_bid(self.listing.id, self.bidder, Decimal("50.00")))
+
+    def test_listing_view_places_bid(self):
+        self.client.force_login(self.bidder)
+        response = self.client.post(reverse("listings", args=[self.listing.id]), {"bid": "11.50"})
+        self.assertEqual(response.context["message"], "Success! You have placed your new bid.")
+        self.assertEqual(response.context["listing"].price, Decimal("11.50"))
+
+
+class ProxyBidTests(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.alice = User.objects.create_user("alice", "alice@example.com", "password")
+        self.bob = User.objects.create_user("bob", "bob@example.com", "password")
+        self.listing = Listing.objects.create(title="Clock", price=Decimal("10.00"), lister=self.seller)
+
+    def assertLeads(self, bidder, price):
+        self.listing.refresh_from_db()
+        self.assertEqual((self.listing.highest_bidder, self.listing.price), (bidder, Decimal(price)))
+
+    def test_increments(self):
+        self.assertEqual(bid_increment(Decimal("0.50")), Decimal("0.05"))
+        self.assertEqual(bid_increment(Decimal("24.99")), Decimal("0.50"))
+        self.assertEqual(bid_increment(Decimal("25.00")), Decimal("1.00"))
+        self.assertEqual(bid_increment(Decimal("1000000")), Decimal("100.00"))
+
+    def test_first_maximum_opens_one_increment_above_the_price(self):
+        self.assertTrue(set_maximum_bid(self.listing.id, self.alice, Decimal("50.00")))
+        self.assertLeads(self.alice, "10.50")
+        # Raising your own maximum while leading doesn't raise the price
+        self.assertTrue(set_maximum_bid(self.listing.id, self.alice, Decimal("80.00")))
+        self.assertLeads(self.alice, "10.50")
+        self.assertEqual(self.listing.bid_count, 1)
+
+    def test_bidding_war_is_settled_at_once(self):
+        set_maximum_bid(self.listing.id, self.alice, Decimal("50.00"))
+        self.assertTrue(set_maximum_bid(self.listing.id, self.bob, Decimal("60.00")))
+        # One increment over alice's maximum, which is recorded as her last bid
+        self.assertLeads(self.bob, "51.00")
+        self.assertEqual([(bid.bidder, bid.bid) for bid in top_bids(self.listing.id, 2)],
+                         [(self.bob, Decimal("51.00")), (self.alice, Decimal("50.00"))])
+        self.assertEqual(self.listing.bid_count, 3)
+
+    def test_increment_never_exceeds_the_winning_maximum(self):
+        set_maximum_bid(self.listing.id, self.alice, Decimal("50.00"))
+        set_maximum_bid(self.listing.id, self.bob, Decimal("50.40"))
+        self.assertLeads(self.bob, "50.40")
+
+    def test_tie_goes_to_the_earlier_maximum(self):
+        set_maximum_bid(self.listing.id, self.alice, Decimal("50.00"))
+        self.assertTrue(set_maximum_bid(self.listing.id, self.bob, Decimal("50.00")))
+        self.assertLeads(self.alice, "50.00")
+        self.assertEqual(top_bids(self.listing.id, 1)[0].bidder, self.alice)
+
+        # Raising a maximum makes it the later one
+        set_maximum_bid(self.listing.id, self.alice, Decimal("70.00"))
+        set_maximum_bid(self.listing.id, self.bob, Decimal("70.00"))
+        self.assertLeads(self.alice, "70.00")
+
+    def test_maximum_can_only_be_raised(self):
+        set_maximum_bid(self.listing.id, self.alice, Decimal("50.00"))
+        self.assertFalse(set_maximum_bid(self.listing.id, self.alice, Decimal("40.00")))
+        self.assertEqual(ProxyBid.objects.get(bidder=self.alice).maximum, Decimal("50.00"))
+        self.assertFalse(set_maximum_bid(self.listing.id, self.bob, Decimal("10.00")))
+        self.assertFalse(ProxyBid.objects.filter(bidder=self.bob).exists())
+
+    def test_closed_listing_rejects_maximums(self):
+        Listing.objects.filter(pk=self.listing.id).update(active=False)
+        self.assertFalse(set_maximum_bid(self.listing.id, self.alice, Decimal("50.00")))
+        self.assertFalse(ProxyBid.objects.exists())
+        self.assertFalse(Bid.objects.exists())
+
+    def test_direct_bid_is_answered_by_a_maximum(self):
+        set_maximum_bid(self.listing.id, self.alice, Decimal("50.00"))
+        self.assertTrue(place_bid(self.listing.id, self.bob, Decimal("30.00")))
+        self.assertLeads(self.alice, "31.00")
+        # A bid over the maximum takes the lead
+        self.assertTrue(place_bid(self.listing.id, self.bob, Decimal("55.00")))
+        self.assertLeads(self.bob, "55.00")
+        self.assertEqual(self.listing.bid_count, 4)
+
+    def test_settling_reads_only_the_top_of_the_index(self):
+        bidders = [User.objects.create(username=f"bidder{i}") for i in range(200)]
+        ProxyBid.objects.bulk_create([
+            ProxyBid(bidder=bidder, listing=self.listing, maximum=Decimal(20 + i))
+            for i, bidder in enumerate(bidders)
+        ])
+        # Read the listing, read the two highest maximums, write the bids and the price
+        with transaction.atomic(), self.assertNumQueries(4):
+            self.assertTrue(resolve_proxy_bids(self.listing.id))
+        self.assertLeads(bidders[-1], "219.00")
+        plan = (ProxyBid.objects.filter(listing=self.listing, maximum__gt=Decimal("10"))
+                .order_by("-maximum", "placed_at", "id")[:2].explain())
+        self.assertIn("proxy_listing_maximum_idx", plan)
+
+    def test_listing_view_sets_a_maximum(self):
+        set_maximum_bid(self.listing.id, self.alice, Decimal("50.00"))
+        self.client.force_login(self.bob)
+        url = reverse("listings", args=[self.listing.id])
+        response = self.client.post(url, {"bid": "40.00", "maximum": "on"})
+        self.assertEqual(response.context["message"], "Another bidder's maximum bid is higher. You have been outbid.")
+        self.assertEqual(response.context["listing"].price, Decimal("41.00"))
+        response = self.client.post(url, {"bid": "90.00", "maximum": "on"})
+        self.assertEqual(response.context["message"], "Success! You lead, and will be bid for up to $90.00.")
+        self.assertEqual(response.context["listing"].price, Decimal("51.00"))
+
+
+class BidStatsTests(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.alice = User.objects.create_user("alice", "alice@example.com", "password")
+        self.bob = User.objects.create_user("bob", "bob@example.com", "password")
+        self.listing = Listing.objects.create(title="Chair", lister=self.seller)
+        self.empty = Listing.objects.create(title="Table", lister=self.seller)
+
+        # Bids written directly, bypassing place_bid(), like pre-existing data
+        Bid.objects.create(bidder=self.alice, bid_for=self.listing, bid=Decimal("20.00"))
+        Bid.objects.create(bidder=self.bob, bid_for=self.listing, bid=Decimal("25.00"))
+        Bid.objects.create(bidder=self.alice, bid_for=self.listing, bid=Decimal("25.00"))
+
+    def test_rebuild_bid_stats_command(self):
+        out = StringIO()
+        call_command("rebuild_bid_stats", stdout=out)
+        self.assertIn("2 listing(s)", out.getvalue())
+
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.bid_count, 3)
+        self.assertEqual(self.listing.highest_bid, Decimal("25.00"))
+        # The earlier of two equal bids is the highest
+        self.assertEqual(self.listing.highest_bidder, self.bob)
+
+        self.empty.refresh_from_db()
+        self.assertEqual(self.empty.bid_count, 0)
+        self.assertIsNone(self.empty.highest_bid)
+        self.assertIsNone(self.empty.highest_bidder)
+
+    def test_close_listing_uses_highest_bidder(self):
+        call_command("rebuild_bid_stats", stdout=StringIO())
+        self.client.force_login(self.seller)
+        self.client.get(reverse("closeListing", args=[self.listing.id]))
+        self.listing.refresh_from_db()
+        self.assertFalse(self.listing.active)
+        self.assertEqual(self.listing.winner, self.bob)
+
+
+class ListingDetailQueryTests(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.viewer = User.objects.create_user("viewer", "viewer@example.com", "password")
+        self.listing = Listing.objects.create(title="Bike", lister=self.seller)
+        self.url = reverse("listings", args=[self.listing.id])
+        cache.clear()
+
+    def add_activity(self, count):
+        commenters = [User.objects.create(username=f"commenter{i}") for i in range(count)]
+        Comment.objects.bulk_create([
+            Comment(comment=f"Comment {i}", commenter=commenter, comment_for=self.listing)
+            for i, commenter in enumerate(commenters)
+        ])
+        for i, commenter in enumerate(commenters):
+            place_bid(self.listing.id, commenter, Decimal(20 + i))
+
+    def test_anonymous_query_count_is_fixed(self):
+        # Listing with lister and winner, comments with their commenters, top bids
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+        self.add_activity(10)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertContains(response, "commenter9")
+        self.assertEqual([bid.bid for bid in response.context["top_bids"]], [Decimal(n) for n in (29, 28, 27, 26, 25)])
+
+    def test_authenticated_query_count_is_fixed(self):
+        self.client.force_login(self.viewer)
+        Watchlist.objects.create(watched_by=self.viewer, listing=self.listing)
+        get_watchlist_count(self.viewer)
+        # The session is cached by force_login() and the user by the first
+        # request; then listing, comments, top bids
+        with self.assertNumQueries(4):
+            self.client.get(self.url)
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+        self.add_activity(10)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertTrue(response.context["is_watched"])
+        self.assertEqual(response.context["listing"].bid_count, 10)
+
+    def test_missing_listing(self):
+        response = self.client.get(reverse("listings", args=[999]))
+        self.assertIsNone(response.context["listing"])
+
+
+class BidLadderTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.bidders = [User.objects.create_user(f"bidder{i}", "", "password") for i in range(3)]
+        self.listing = Listing.objects.create(title="Oak table", price=Decimal("1.00"), lister=self.seller)
+        for amount in range(2, 122):
+            place_bid(self.listing.id, self.bidders[amount % 3], Decimal(amount))
+
+    def test_ladder_is_read_from_the_covering_index(self):
+        queryset = ladder(self.listing.id).select_related("bidder")[:TOP_BIDS]
+        plan = queryset.explain()
+        self.assertIn("COVERING INDEX bid_listing_amount_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+        self.assertEqual([bid.bid for bid in top_bids(self.listing.id)],
+                         [Decimal(n) for n in range(121, 116, -1)])
+
+    def test_ties_go_to_the_earliest_bid(self):
+        # Only possible for bids from before place_bid, but the ladder agrees with the bid statistics
+        first = Bid.objects.create(bidder=self.bidders[0], bid_for=self.listing, bid=Decimal("500"))
+        Bid.objects.create(bidder=self.bidders[1], bid_for=self.listing, bid=Decimal("500"))
+        self.assertEqual(top_bids(self.listing.id, 1), [first])
+
+    def test_history_pages_through_every_bid(self):
+        url = reverse("apiBidHistory", args=[self.listing.id])
+        amounts = []
+        cursor = None
+        while True:
+            params = {"after": cursor} if cursor else {}
+            page = self.client.get(url, params).json()
+            amounts += [Decimal(bid["amount"]) for bid in page["bids"]]
+            cursor = page["next"]
+            if cursor is None:
+                break
+
+        self.assertEqual(amounts, [Decimal(n) for n in range(121, 1, -1)])
+        bid = self.client.get(url, {"fields": "bidder,amount,date"}).json()["bids"][0]
+        self.assertEqual(set(bid), {"bidder", "amount", "date"})
+        self.assertEqual(bid["bidder"], "bidder1")
+
+    def test_garbled_cursor_starts_from_the_top(self):
+        url = reverse("apiBidHistory", args=[self.listing.id])
+        for amount in ["NaN", "sNaN", "Infinity", "-Infinity"]:
+            cursor = encode_ladder_cursor(amount, 1)
+            self.assertIsNone(decode_ladder_cursor(cursor))
+            response = self.client.get(url, {"after": cursor})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["bids"][0]["amount"], "121.00")
+        self.assertIsNone(decode_ladder_cursor("not-a-cursor"))
+
+    def test_top_bids(self):
+        url = reverse("apiTopBids", args=[self.listing.id])
+        response = self.client.get(url, {"n": 3, "fields": "amount"})
+        self.assertEqual(response.json(), {"bids": [{"amount": "121.00"}, {"amount": "120.00"}, {"amount": "119.00"}]})
+
+        # Unchanged until the next bid
+        cached = self.client.get(url, {"n": 3, "fields": "amount"}, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+        place_bid(self.listing.id, self.bidders[0], Decimal("200"))
+        response = self.client.get(url, {"n": 3, "fields": "amount"}, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.json()["bids"][0], {"amount": "200.00"})
+
+        self.assertEqual(self.client.get(url, {"n": "many"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("apiTopBids", args=[self.listing.id + 1])).status_code, 404)
+
+    def test_listing_page_shows_the_top_bids(self):
+        response = self.client.get(reverse("listings", args=[self.listing.id]))
+        self.assertContains(response, "$121.00 by <strong>bidder1</strong>")
+        self.assertNotContains(response, "$116.00 by")
+
+
+class CommentPagingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.commenter = User.objects.create_user("commenter", "", "password")
+        self.listing = Listing.objects.create(title="Oak table", lister=self.seller)
+        Comment.objects.bulk_create([
+            Comment(comment=f"Comment {i}", commenter=self.commenter, comment_for=self.listing)
+            for i in range(45)
+        ])
+
+    def test_pages_are_read_from_the_index(self):
+        queryset = Comment.objects.filter(comment_for=self.listing.id).order_by("date", "id")[:21]
+        plan = queryset.explain()
+        self.assertIn("comment_listing_date_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_listing_page_shows_the_first_page(self):
+        response = self.client.get(reverse("listings", args=[self.listing.id]))
+        self.assertEqual([comment.comment for comment in response.context["comments"]],
+                         [f"Comment {i}" for i in range(20)])
+        self.assertNotContains(response, "Comment 20<")
+        self.assertContains(response, "Load more comments")
+
+    def test_load_more_pages_through_every_comment(self):
+        cursor = self.client.get(reverse("listings", args=[self.listing.id])).context["next_comments_cursor"]
+        url = reverse("listingComments", args=[self.listing.id])
+        pages = []
+        while cursor:
+            page = self.client.get(url, {"after": cursor}).json()
+            pages.append(page["html"])
+            cursor = page["next"]
+
+        self.assertEqual(len(pages), 2)
+        self.assertIn("Comment 20 ", pages[0])
+        self.assertIn("Comment 44 ", pages[1])
+        self.assertNotIn("Comment 39 ", pages[1])
+        self.assertEqual(self.client.get(reverse("listingComments", args=[self.listing.id + 1])).status_code, 404)
+
+    def test_create_comment_returns_the_new_comment(self):
+        self.client.force_login(self.commenter)
+        response = self.client.post(reverse("createComment"),
+                                    {"listing_id": self.listing.id, "comment": "Still for sale?"})
+        self.assertEqual(response.status_code, 201)
+        self.assertContains(response, "Still for sale?", status_code=201)
+        self.assertNotContains(response, "Comment 0", status_code=201)
+        self.assertEqual(Comment.objects.filter(comment_for=self.listing).count(), 46)
+
+        response = self.client.post(reverse("createComment"), {"listing_id": self.listing.id, "comment": ""})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("comment", response.json()["errors"])
+        response = self.client.post(reverse("createComment"), {"listing_id": self.listing.id + 1, "comment": "Hello there"})
+        self.assertEqual(response.status_code, 404)
+
+
+class WatchlistCountTests(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.viewer = User.objects.create_user("viewer", "viewer@example.com", "password")
+        self.listings = [Listing.objects.create(title=f"Item {i}", lister=self.seller) for i in range(3)]
+        cache.clear()
+        self.client.force_login(self.viewer)
+
+    def toggle(self, listing):
+        self.client.post(reverse("toggleWatchlist"), {"listing_id": listing.id})
+
+    def test_count_is_served_from_cache(self):
+        Watchlist.objects.create(watched_by=self.viewer, listing=self.listings[0])
+        self.assertEqual(self.client.get(reverse("index")).context["watchlist_count"], 1)
+        # Only the listings page: the session, user and count are cached
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("index"))
+        self.assertEqual(response.context["watchlist_count"], 1)
+
+    def test_toggle_updates_cached_count(self):
+        self.assertEqual(get_watchlist_count(self.viewer), 0)
+        self.toggle(self.listings[0])
+        self.toggle(self.listings[1])
+        self.assertEqual(get_watchlist_count(self.viewer), 2)
+        self.toggle(self.listings[0])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_watchlist_count(self.viewer), 1)
+
+    def test_count_stored_meanwhile_wins(self):
+        def other_request_stores_a_count(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            cache.set(f"watchlist_count:{self.viewer.pk}", 2)
+            return result
+
+        with connection.execute_wrapper(other_request_stores_a_count):
+            self.assertEqual(get_watchlist_count(self.viewer), 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_watchlist_count(self.viewer), 2)
+
+    def test_cached_count_expires(self):
+        with mock.patch.object(cache, "add", wraps=cache.add) as add:
+            get_watchlist_count(self.viewer)
+        self.assertEqual(add.call_args.args[2], COUNT_TIMEOUT)
+
+    def test_deleting_listing_updates_cached_count(self):
+        self.toggle(self.listings[0])
+        self.toggle(self.listings[1])
+        self.assertEqual(get_watchlist_count(self.viewer), 2)
+        self.listings[1].delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_watchlist_count(self.viewer), 1)
+
+    def test_toggle_runs_no_reads(self):
+        # The user (cached from then on), then DELETE and INSERT (inside a savepoint)
+        with self.assertNumQueries(5):
+            self.toggle(self.listings[0])
+        # DELETE
+        with self.assertNumQueries(1):
+            self.toggle(self.listings[0])
+        self.assertFalse(Watchlist.objects.exists())
+
+    def test_entries_are_unique(self):
+        Watchlist.objects.create(watched_by=self.viewer, listing=self.listings[0])
+        with self.assertRaises(IntegrityError):
+            Watchlist.objects.create(watched_by=self.viewer, listing=self.listings[0])
+
+    def test_watchlist_page_is_one_query(self):
+        self.toggle(self.listings[0])
+        self.toggle(self.listings[2])
+        Listing.objects.filter(pk=self.listings[2].pk).update(active=False, price=Decimal("99.00"))
+        get_watchlist_count(self.viewer)
+        # Watched listings; the session and user are cached
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("watchlist"))
+        watched = {listing.id: listing for listing in response.context["watchlist"]}
+        self.assertEqual(set(watched), {self.listings[0].id, self.listings[2].id})
+        self.assertFalse(watched[self.listings[2].id].active)
+        self.assertEqual(watched[self.listings[2].id].price, Decimal("99.00"))
+
+    def test_anonymous_pages_have_no_count(self):
+        self.client.logout()
+        self.assertNotIn("watchlist_count", self.client.get(reverse("index")).context)
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.lamp = Listing.objects.create(title="Brass lamp", description="Old desk lamp",
+                                           category="APPLIANCES", lister=self.seller)
+        self.desk = Listing.objects.create(title="Oak desk", description="Comes with a lamp",
+                                           category="FURNITURE", lister=self.seller)
+        self.bike = Listing.objects.create(title="Road bike", lister=self.seller, active=False)
+
+    def search(self, text, **filters):
+        return [listing.id for listing in search_listings(text, **filters)[0]]
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.search("lamp"), [self.lamp.id, self.desk.id])
+
+    def test_filters(self):
+        self.assertEqual(self.search("lamp", category="FURNITURE"), [self.desk.id])
+        self.assertEqual(self.search("bike", active=True), [])
+        self.assertEqual(self.search("bike", active=False), [self.bike.id])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.bike.title = "Mountain bicycle"
+        self.bike.save()
+        self.assertEqual(self.search("road"), [])
+        self.assertEqual(self.search("mountain"), [self.bike.id])
+        self.bike.delete()
+        self.assertEqual(self.search("mountain"), [])
+
+    def test_prefix_and_stemming(self):
+        self.assertEqual(self.search("bras"), [self.lamp.id])
+        self.assertEqual(self.search("lamps"), [self.lamp.id, self.desk.id])
+
+    def test_user_input_is_not_fts_syntax(self):
+        self.assertEqual(fts_query('lamp" OR NEAR(desk'), '"lamp" "OR" "NEAR" "desk"*')
+        self.assertIsNone(fts_query("  ***  "))
+        self.assertEqual(self.search('"lamp'), [self.lamp.id, self.desk.id])
+
+    def test_pagination(self):
+        Listing.objects.bulk_create([Listing(title=f"Lamp {i}", lister=self.seller) for i in range(5)])
+        first, has_next = search_listings("lamp", per_page=4)
+        second, has_more = search_listings("lamp", page=2, per_page=4)
+        self.assertTrue(has_next)
+        self.assertFalse(has_more)
+        self.assertEqual(len(first) + len(second), 7)
+        self.assertFalse({l.id for l in first} & {l.id for l in second})
+
+    def test_search_view(self):
+        response = self.client.get(reverse("search"), {"q": "lamp", "category": "appliances"})
+        self.assertEqual([l.id for l in response.context["listings"]], [self.lamp.id])
+        self.assertContains(response, "Brass lamp")
+
+    def test_page_number_is_bounded(self):
+        for page, expected in [("99999999999999999999", MAX_SEARCH_PAGE), ("x", 1), ("-3", 1)]:
+            response = self.client.get(reverse("search"), {"q": "lamp", "page": page})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context["page"], expected)
+        self.assertIsNone(response.context["previous_page"])
+
+
+class CategoryFacetTests(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.client.force_login(self.seller)
+        cache.clear()
+
+    def counts(self):
+        return {category: count for category, name, count in category_facets()}
+
+    def create_listing(self, title, category):
+        self.client.post(reverse("createListing"), {"title": title, "price": "10", "category": category})
+        return Listing.objects.get(title=title)
+
+    def test_counts_follow_create_close_and_delete(self):
+        house = self.create_listing("House", "REAL_ESTATE")
+        flat = self.create_listing("Flat", "REAL_ESTATE")
+        self.create_listing("Drill", "TOOLS")
+        self.assertEqual(self.counts()["REAL_ESTATE"], 2)
+        self.assertEqual(self.counts()["TOOLS"], 1)
+
+        self.client.get(reverse("closeListing", args=[house.id]))
+        # Closing twice must not count twice
+        self.client.get(reverse("closeListing", args=[house.id]))
+        self.assertEqual(self.counts()["REAL_ESTATE"], 1)
+
+        flat.delete()
+        self.assertEqual(self.counts()["REAL_ESTATE"], 0)
+
+    def test_rebuild_matches_listings(self):
+        Listing.objects.create(title="Shirt", category="FASHION", lister=self.seller)
+        Listing.objects.create(title="Coat", category="FASHION", lister=self.seller, active=False)
+        CategoryCount.objects.all().delete()
+        rebuild_category_counts()
+        self.assertEqual(self.counts()["FASHION"], 1)
+        self.assertEqual(CategoryCount.objects.count(), 9)
+
+    def test_categories_page(self):
+        self.create_listing("House", "REAL_ESTATE")
+        self.create_listing("Drill", "TOOLS")
+        get_watchlist_count(self.seller)
+        # The session and user are cached by the first request
+        self.client.get(reverse("listingsByCategories"))
+        # Category counts, listings
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("listingsByCategories"), {"category": "REAL_ESTATE"})
+        self.assertEqual([l.title for l in response.context["listings"]], ["House"])
+        self.assertEqual(response.context["categories"][0], ("ANY", "Any", 2))
+        self.assertContains(response, "Real Estate (1)")
+
+
+class ExpiryTests(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        now = timezone.now()
+        self.expired = [
+            Listing.objects.create(title=f"Expired {i}", category="TOYS", lister=self.seller,
+                                   ends_at=now + timedelta(minutes=1))
+            for i in range(7)
+        ]
+        for listing in self.expired[:3]:
+            place_bid(listing.id, self.bidder, Decimal("20.00"))
+        Listing.objects.filter(pk__in=[l.id for l in self.expired]).update(ends_at=now - timedelta(minutes=1))
+
+        self.running = Listing.objects.create(title="Running", category="TOYS", lister=self.seller,
+                                              ends_at=now + timedelta(days=1))
+        self.open_ended = Listing.objects.create(title="Open ended", category="TOYS", lister=self.seller)
+
+    def test_closes_expired_listings_in_batches(self):
+        self.assertEqual(close_expired_listings(batch_size=3), 7)
+
+        self.assertEqual(Listing.objects.filter(active=True).count(), 2)
+        winners = dict(Listing.objects.filter(active=False).values_list("title", "winner"))
+        self.assertEqual(winners["Expired 0"], self.bidder.id)
+        self.assertIsNone(winners["Expired 5"])
+        self.assertEqual(category_facets()[6], ("TOYS", "Toys", 2))
+
+    def test_batch_uses_fixed_number_of_queries(self):
+        # Per batch: find expired ids, count them by category, close them,
+        # queue the winner notices and adjust the category count (plus the
+        # savepoint around them, as tests run inside a transaction); then one
+        # more query finds nothing left
+        with self.assertNumQueries(8):
+            close_expired_listings(batch_size=100)
+
+    def test_command(self):
+        out = StringIO()
+        call_command("close_expired_listings", stdout=out)
+        self.assertIn("Closed 7 expired listing(s).", out.getvalue())
+        self.assertEqual(close_expired_listings(), 0)
+
+    def test_listing_with_duration(self):
+        self.client.force_login(self.seller)
+        self.client.post(reverse("createListing"), {"title": "Timed", "price": "10",
+                                                    "category": "TOYS", "duration": "3"})
+        listing = Listing.objects.get(title="Timed")
+        self.assertAlmostEqual(listing.ends_at, timezone.now() + timedelta(days=3), delta=timedelta(minutes=1))
+
+
+class LiveBrokerTests(SimpleTestCase):
+
+    SUBSCRIBERS = 5000
+
+    async def test_thousands_of_idle_subscribers(self):
+        broker = InProcessBroker()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+
+        subscriptions = [broker.subscribe(f"listing:{i % 50}") for i in range(self.SUBSCRIBERS)]
+        waiters = [asyncio.ensure_future(subscription.get()) for subscription in subscriptions]
+        await asyncio.sleep(0)
+
+        per_subscriber = (tracemalloc.get_traced_memory()[0] - before) / self.SUBSCRIBERS
+        tracemalloc.stop()
+        logging.info("live broker: %d idle subscribers, %.0f bytes each", self.SUBSCRIBERS, per_subscriber)
+        self.assertLess(per_subscriber, 8 * 1024)
+
+        # Publish from another thread, like a sync view under ASGI
+        publisher = threading.Thread(target=broker.publish, args=("listing:7", {"type": "bid"}))
+        publisher.start()
+        publisher.join()
+        await asyncio.sleep(0.01)
+        self.assertEqual(sum(waiter.done() for waiter in waiters), self.SUBSCRIBERS // 50)
+
+        for waiter in waiters:
+            waiter.cancel()
+        for subscription in subscriptions:
+            subscription.close()
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    async def test_slow_subscriber_keeps_only_latest_events(self):
+        broker = InProcessBroker()
+        async with broker.subscribe("listing:1") as subscription:
+            for price in range(20):
+                broker.publish("listing:1", {"type": "bid", "price": price})
+            await asyncio.sleep(0)
+            self.assertEqual(subscription.queue.qsize(), Subscription.MAX_PENDING)
+            self.assertEqual((await subscription.get())["price"], 20 - Subscription.MAX_PENDING)
+        self.assertEqual(broker.subscriber_count(), 0)
+
+
+class LiveListingTests(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        self.listing = Listing.objects.create(title="Vase", lister=self.seller)
+
+    def test_accepted_bid_is_published_after_commit(self):
+        with mock.patch("auctions.bidding.publish_listing_event") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                place_bid(self.listing.id, self.bidder, Decimal("15.00"))
+                place_bid(self.listing.id, self.bidder, Decimal("12.00"))
+                publish.assert_not_called()
+        publish.assert_called_once_with(self.listing.id, "bid", price="15.00", bid_count=1, bidder="bidder")
+
+    def test_closing_is_published(self):
+        with mock.patch("auctions.closing.publish_listing_event") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.force_login(self.seller)
+                self.client.get(reverse("closeListing", args=[self.listing.id]))
+        publish.assert_called_once_with(self.listing.id, "closed")
+
+    async def test_event_stream(self):
+        response = await self.async_client.get(reverse("listingEvents", args=[self.listing.id]))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b"retry: 5000\n\n")
+
+        publish_listing_event(self.listing.id, "bid", price="15.00", bid_count=1)
+        self.assertIn(b'"price": "15.00"', await anext(stream))
+        publish_listing_event(self.listing.id, "closed")
+        self.assertTrue((await anext(stream)).startswith(b"event: closed"))
+        with self.assertRaises(StopAsyncIteration):
+            await anext(stream)
+        self.assertEqual(get_broker().subscriber_count(), 0)
+
+    def test_no_event_stream_under_wsgi(self):
+        response = self.client.get(reverse("listingEvents", args=[self.listing.id]))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(get_broker().subscriber_count(), 0)
+
+
+class PageCacheTests(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        self.listing = Listing.objects.create(title="Teapot", category="APPLIANCES", lister=self.seller)
+        cache.clear()
+
+    def test_anonymous_index_is_served_from_cache(self):
+        self.client.get(reverse("index"))
+        hits = page_cache_stats()["hits"]
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("index"))
+        self.assertContains(response, "Teapot")
+        self.assertEqual(page_cache_stats()["hits"], hits + 1)
+
+    def test_changes_invalidate_cached_pages(self):
+        url = reverse("listingsByCategories")
+        self.client.get(url, {"category": "APPLIANCES"})
+
+        # The version is bumped once the change is committed
+        with self.captureOnCommitCallbacks(execute=True):
+            place_bid(self.listing.id, self.bidder, Decimal("42.00"))
+        self.assertContains(self.client.get(url, {"category": "APPLIANCES"}), "42.00")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Listing.objects.create(title="Toaster", category="APPLIANCES", lister=self.seller)
+        self.assertContains(self.client.get(url, {"category": "APPLIANCES"}), "Toaster")
+
+        self.client.force_login(self.seller)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("closeListing", args=[self.listing.id]))
+        self.client.logout()
+        self.assertNotContains(self.client.get(url, {"category": "APPLIANCES"}), "Teapot")
+
+    def test_maximum_bids_invalidate_cached_pages(self):
+        self.client.get(reverse("index"))
+        version = listings_version()
+        # Settled without post_save signals
+        with self.captureOnCommitCallbacks(execute=True):
+            set_maximum_bid(self.listing.id, self.bidder, Decimal("50.00"))
+        self.assertGreater(listings_version(), version)
+        self.assertContains(self.client.get(reverse("index")), "10.50")
+
+    def test_category_is_part_of_the_key(self):
+        url = reverse("listingsByCategories")
+        self.assertContains(self.client.get(url, {"category": "APPLIANCES"}), "Teapot")
+        self.assertNotContains(self.client.get(url, {"category": "TOYS"}), "Teapot")
+
+    def test_signed_in_users_are_not_cached(self):
+        self.client.force_login(self.bidder)
+        self.client.get(reverse("index"))
+        response = self.client.get(reverse("index"))
+        # Rendered by the view, so the template context is there
+        self.assertEqual(response.context["watchlist_count"], 0)
+
+
+class ListingCardCacheTests(TestCase):
+
+    def setUp(self):
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        self.listing = Listing.objects.create(title="Clock", category="FURNITURE", lister=self.seller)
+        Watchlist.objects.create(watched_by=self.bidder, listing=self.listing)
+        cache.clear()
+        self.client.force_login(self.bidder)
+
+    def test_card_is_shared_between_pages(self):
+        self.client.get(reverse("index"))
+        # A card cached by the index page is reused by the others: change the
+        # title behind the cache's back and the old title is still shown
+        Listing.objects.filter(pk=self.listing.pk).update(title="Renamed")
+        self.assertContains(self.client.get(reverse("watchlist")), "Clock")
+        self.assertContains(self.client.get(reverse("listingsByCategories"), {"category": "FURNITURE"}), "Clock")
+
+    def test_card_follows_updates(self):
+        self.assertContains(self.client.get(reverse("watchlist")), "$10.00")
+        place_bid(self.listing.id, self.bidder, Decimal("30.00"))
+        self.assertContains(self.client.get(reverse("watchlist")), "$30.00")
+
+        self.client.force_login(self.seller)
+        self.client.get(reverse("closeListing", args=[self.listing.id]))
+        self.client.force_login(self.bidder)
+        self.assertContains(self.client.get(reverse("watchlist")), "Closed")
+
+    def test_precompile_templates(self):
+        self.assertGreater(precompile_templates(), 10)
+
+
+class RequestMetricsTests(TestCase):
+
+    def setUp(self):
+        self.staff = User.objects.create_user("staff", "staff@example.com", "password", is_staff=True)
+        self.listing = Listing.objects.create(title="Desk", lister=self.staff)
+        metrics_registry.reset()
+        cache.clear()
+
+    def test_records_queries_time_and_size_per_url_name(self):
+        response = self.client.get(reverse("listings", args=[self.listing.id]))
+        self.client.get(reverse("listings", args=[self.listing.id]))
+        self.client.get("/no-such-page")
+
+        snapshot = metrics_registry.snapshot()
+        listing = snapshot["listings"]
+        self.assertEqual(listing["requests"], 2)
+        self.assertEqual(listing["mean_queries"], 3)
+        self.assertEqual(listing["mean_response_bytes"], len(response.content))
+        self.assertGreater(listing["mean_wall_ms"], 0)
+        self.assertGreaterEqual(listing["mean_wall_ms"], listing["mean_sql_ms"])
+        self.assertEqual(sum(listing["latency_histogram_ms"].values()), 2)
+        self.assertEqual(snapshot["unresolved"]["requests"], 1)
+
+    async def test_async_requests_count_queries(self):
+        # The async ORM queries on another thread, with its own connection
+        await self.async_client.get(reverse("index"))
+        await self.async_client.get(reverse("listings", args=[self.listing.id]))
+        snapshot = metrics_registry.snapshot()
+        self.assertEqual(snapshot["index"]["mean_queries"], 1)
+        self.assertEqual(snapshot["listings"]["mean_queries"], 3)
+        self.assertGreater(snapshot["listings"]["mean_sql_ms"], 0)
+
+    @override_settings(AUCTIONS_METRICS_SAMPLE_RATE=0)
+    def test_sampling_turned_off(self):
+        self.client.get(reverse("index"))
+        self.assertEqual(metrics_registry.snapshot(), {})
+
+    def test_metrics_endpoint_is_staff_only(self):
+        self.client.get(reverse("index"))
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 302)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.json()["index"]["requests"], 1)
+
+        self.client.post(reverse("metrics"), {"reset": "1"})
+        self.assertNotIn("index", metrics_registry.snapshot())
+
+
+class SyntheticDataTests(TestCase):
+
+    def test_generate(self):
+        users = generate(users=5, listings=20, bids=60, comments=30, watchlist=25, seed=3)
+        self.assertEqual(len(users), 5)
+        self.assertEqual(Listing.objects.count(), 20)
+        self.assertEqual(Bid.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 30)
+        self.assertLessEqual(Watchlist.objects.count(), 25)
+
+        # Derived data matches the bids and listings
+        self.assertEqual(sum(Listing.objects.values_list("bid_count", flat=True)), 60)
+        for listing in Listing.objects.filter(bid_count__gt=0):
+            top = Bid.objects.filter(bid_for=listing).order_by("-bid").first()
+            self.assertEqual((listing.price, listing.highest_bid), (top.bid, top.bid))
+        self.assertEqual(sum(count for _, _, count in category_facets()), 20)
+
+    def test_generate_twice_with_the_same_seed(self):
+        first = generate(users=3, listings=5, bids=5, comments=5, watchlist=5)
+        second = generate(users=3, listings=5, bids=5, comments=5, watchlist=5)
+        self.assertFalse({user.username for user in first} & {user.username for user in second})
+        self.assertEqual(list(Listing.objects.filter(lister__in=first).order_by("id").values_list("title", flat=True)),
+                         list(Listing.objects.filter(lister__in=second).order_by("id").values_list("title", flat=True)))
+
+    def test_benchmark_views_against_baseline(self):
+        out = StringIO()
+        baseline = os.path.join(tempfile.mkdtemp(), "baseline.json")
+        sizes = ["--requests", "3", "--users", "5", "--listings", "20", "--bids", "20",
+                 "--comments", "10", "--watchlist", "10"]
+
+        call_command("benchmark_views", *sizes, "--save", baseline, stdout=out)
+        self.assertIn("skipped: streams events", out.getvalue())
+        self.assertFalse(Listing.objects.exists())
+
+        # Pretend every view used to be much faster with fewer queries
+        with open(baseline) as f:
+            results = json.load(f)
+        for result in results.values():
+            result["p95_ms"] = 0.0001
+            result["max_queries"] = 0
+        with open(baseline, "w") as f:
+            json.dump(results, f)
+
+        with self.assertRaisesMessage(CommandError, "listings: queries 0 -> 3"):
+            call_command("benchmark_views", *sizes, "--baseline", baseline, stdout=StringIO())
+
+
+class BulkListingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user("staff", "staff@example.com", "password", is_staff=True)
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+
+    def csv_rows(self, count):
+        yield "title,description,price,category,duration,photo_url\n"
+        for i in range(count):
+            yield f"Imported {i},Row {i},{10 + i},TECH,,\n"
+
+    def test_import_creates_listings_in_batches(self):
+        with self.assertNumQueries(20):
+            # Per batch of 50: a savepoint pair, the insert and the category count
+            result = import_listings(read_rows(self.csv_rows(250), "csv"), self.seller, batch_size=50)
+
+        self.assertEqual(result, {"created": 250, "rejected": 0, "errors": []})
+        self.assertEqual(Listing.objects.filter(lister=self.seller).count(), 250)
+        self.assertEqual(CategoryCount.objects.get(category="TECH").active_listings, 250)
+        # The triggers index bulk-created listings for search too
+        self.assertEqual(search_listings("Imported")[0][0].lister_id, self.seller.id)
+
+    def test_import_reads_rows_lazily(self):
+        consumed = []
+
+        def rows():
+            for number, row in read_rows(self.csv_rows(30), "csv"):
+                consumed.append(number)
+                yield number, row
+
+        batches = []
+        with mock.patch("auctions.bulk_listings._create_batch", side_effect=lambda batch: batches.append(len(consumed))):
+            import_listings(rows(), self.seller, batch_size=10)
+        # Each batch was written before the next rows were read
+        self.assertEqual(batches, [10, 20, 30])
+
+    def test_import_skips_invalid_rows(self):
+        lines = [
+            '{"title": "Walnut desk", "price": 25, "category": "FURNITURE", "duration": 3}\n',
+            '{"title": "No", "price": 25, "category": "FURNITURE"}\n',
+            '{"title": "Bad category", "price": 25, "category": "SPACESHIPS"}\n',
+            "not json\n",
+        ]
+        result = import_listings(read_rows(lines, "jsonl"), self.seller)
+
+        self.assertEqual(result["created"], 1)
+        self.assertEqual(result["rejected"], 3)
+        self.assertEqual([error["line"] for error in result["errors"]], [2, 3, 4])
+        self.assertIn("title", result["errors"][0]["error"])
+        listing = Listing.objects.get(title="Walnut desk")
+        self.assertIsNotNone(listing.ends_at)
+
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.writelines(self.csv_rows(3))
+        self.addCleanup(os.remove, f.name)
+
+        out = StringIO()
+        call_command("import_listings", f.name, "--lister", "seller", stdout=out, stderr=StringIO())
+        self.assertIn("Created 3 listing(s), rejected 0.", out.getvalue())
+
+        with open(f.name, "wb") as bad:
+            bad.write(b"title,price\nCaf\xe9 table,10\n")
+        with self.assertRaisesMessage(CommandError, "can't decode"):
+            call_command("import_listings", f.name, "--lister", "seller", stdout=StringIO())
+
+    def test_unreadable_upload_is_a_bad_request(self):
+        self.client.force_login(self.staff)
+        too_long = "title,description\nDesk," + "x" * (csv.field_size_limit() + 1) + "\n"
+        for name, content in [("latin1.csv", b"title,price\nCaf\xe9 table,10\n"),
+                              ("latin1.jsonl", b'{"title": "Caf\xe9 table"}\n'),
+                              ("long.csv", too_long.encode())]:
+            response = self.client.post(reverse("importListings"), {"file": SimpleUploadedFile(name, content)})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("Couldn't read the file", response.json()["error"])
+
+    def test_import_endpoint_is_staff_only(self):
+        upload = SimpleUploadedFile("listings.csv", "".join(self.csv_rows(5)).encode())
+
+        self.client.force_login(self.seller)
+        response = self.client.post(reverse("importListings"), {"file": upload})
+        self.assertEqual(response.status_code, 302)
+
+        upload.seek(0)
+        self.client.force_login(self.staff)
+        response = self.client.post(reverse("importListings"), {"file": upload, "lister": "seller"})
+        self.assertEqual(response.json()["created"], 5)
+        self.assertEqual(Listing.objects.filter(lister=self.seller).count(), 5)
+
+    def test_export_streams_listings_with_bid_statistics(self):
+        listing = Listing.objects.create(title="Oak table", price=Decimal("10.00"), lister=self.seller)
+        place_bid(listing.id, self.staff, Decimal("15.00"))
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("exportListings"))
+        self.assertTrue(response.streaming)
+        rows = list(csv.DictReader(StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(rows[0]["title"], "Oak table")
+        self.assertEqual(rows[0]["bid_count"], "1")
+        self.assertEqual(rows[0]["highest_bid"], "15.00")
+        self.assertEqual(rows[0]["highest_bidder__username"], "staff")
+
+        response = self.client.get(reverse("exportListings"), {"format": "jsonl"})
+        row = json.loads(b"".join(response.streaming_content).decode())
+        self.assertEqual(row["price"], "15.00")
+
+    def test_export_reads_in_chunks(self):
+        Listing.objects.bulk_create(Listing(title=f"Listing {i}", lister=self.seller) for i in range(25))
+        with mock.patch("django.db.models.query.QuerySet.iterator", autospec=True,
+                        side_effect=QuerySet.iterator) as iterator:
+            lines = list(export_rows(Listing.objects.all(), "jsonl", chunk_size=10))
+        self.assertEqual(len(lines), 25)
+        self.assertEqual(iterator.call_args.kwargs["chunk_size"], 10)
+
+
+class ApiTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        self.listing = Listing.objects.create(title="Oak table", description="Solid oak",
+                                              price=Decimal("10.00"), lister=self.seller)
+
+    def test_feed_selects_only_the_requested_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("apiListings"), {"fields": "title,price,lister"})
+
+        self.assertEqual(response.json()["listings"], [{"title": "Oak table", "price": "10.00", "lister": "seller"}])
+        sql = queries[-1]["sql"]
+        self.assertIn('"title"', sql)
+        self.assertNotIn('"description"', sql)
+
+    def test_feed_pages(self):
+        Listing.objects.bulk_create(Listing(title=f"Listing {i}", lister=self.seller) for i in range(30))
+        first = self.client.get(reverse("apiListings"), {"fields": "id"}).json()
+        second = self.client.get(reverse("apiListings"), {"fields": "id", "after": first["next"]}).json()
+
+        self.assertEqual(len(first["listings"]), 24)
+        self.assertEqual(len(second["listings"]), 7)
+        self.assertIsNone(second["next"])
+        ids = [row["id"] for row in first["listings"] + second["listings"]]
+        self.assertEqual(len(set(ids)), 31)
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(reverse("apiListing", args=[self.listing.id]), {"fields": "title,password"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("password", response.json()["error"])
+        self.assertFalse(response.has_header("ETag"))
+
+        response = self.client.get(reverse("apiBidSummary", args=[self.listing.id]), {"fields": "description"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_unchanged_listing_returns_304_without_the_main_query(self):
+        url = reverse("apiListing", args=[self.listing.id])
+        response = self.client.get(url)
+        self.assertEqual(response.json()["title"], "Oak table")
+
+        with self.assertNumQueries(1):
+            # Just the listing's updated_at
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+
+        # A bid changes the listing's version
+        place_bid(self.listing.id, self.bidder, Decimal("15.00"))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["price"], "15.00")
+
+    def test_unchanged_feed_returns_304_without_queries(self):
+        response = self.client.get(reverse("apiListings"))
+        with self.assertNumQueries(0):
+            cached = self.client.get(reverse("apiListings"), HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+
+        # The same page with other fields is a different representation
+        other = self.client.get(reverse("apiListings"), {"fields": "id"}, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(other.status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Listing.objects.create(title="Walnut desk", lister=self.seller)
+        response = self.client.get(reverse("apiListings"), HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+
+    def test_bid_summary(self):
+        place_bid(self.listing.id, self.bidder, Decimal("15.00"))
+        response = self.client.get(reverse("apiBidSummary", args=[self.listing.id]))
+        self.assertEqual(response.json(), {
+            "id": self.listing.id, "price": "15.00", "active": True, "bid_count": 1,
+            "highest_bid": "15.00", "highest_bidder": "bidder",
+        })
+
+    def test_comments(self):
+        Comment.objects.create(commenter=self.bidder, comment_for=self.listing, comment="Is it solid?")
+        url = reverse("apiComments", args=[self.listing.id])
+        response = self.client.get(url, {"fields": "commenter,comment"})
+        self.assertEqual(response.json()["comments"], [{"commenter": "bidder", "comment": "Is it solid?"}])
+
+        cached = self.client.get(url, {"fields": "commenter,comment"}, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+
+        Comment.objects.create(commenter=self.seller, comment_for=self.listing, comment="Very solid.")
+        response = self.client.get(url, {"fields": "commenter,comment"}, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(len(response.json()["comments"]), 2)
+
+        # An edit changes neither the number of comments nor the latest one
+        comment = Comment.objects.get(comment="Is it solid?")
+        comment.comment = "Is it solid oak?"
+        comment.save()
+        response = self.client.get(url, {"fields": "commenter,comment"}, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.json()["comments"][0]["comment"], "Is it solid oak?")
+
+    def test_comments_etag_does_not_read_the_comments(self):
+        url = reverse("apiComments", args=[self.listing.id])
+        etag = self.client.get(url)["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertFalse([query for query in queries if "auctions_comment" in query["sql"]])
+
+    def test_missing_listing(self):
+        for name in ("apiListing", "apiBidSummary", "apiComments"):
+            response = self.client.get(reverse(name, args=[self.listing.id + 100]))
+            self.assertEqual(response.status_code, 404)
+
+
+@skipUnless(thumbnails.available(), "Pillow is not installed")
+class ThumbnailTests(TestCase):
+    # Photos come from a local HTTP server that counts the requests for each
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from PIL import Image
+
+        def png(color, size=(1200, 900)):
+            output = io.BytesIO()
+            Image.new("RGB", size, color).save(output, "PNG")
+            return output.getvalue()
+
+        photos = {"/photo.png": png("red"), "/copy.png": png("red"),
+                  "/other.png": png("blue"), "/tall.png": png("green", (300, 1000)),
+                  "/text.png": b"not an image"}
+        cls.hits = Counter()
+
+        class PhotoHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                cls.hits[self.path] += 1
+                if self.path == "/redirect.png":
+                    # To a cloud metadata address
+                    self.send_response(302)
+                    self.send_header("Location", "http://169.254.169.254/latest/meta-data/")
+                    self.end_headers()
+                    return
+                if self.path not in photos:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.end_headers()
+                self.wfile.write(photos[self.path])
+
+            def log_message(self, *args):
+                pass
+
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), PhotoHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.hits.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # The local photo server is let through the public address check
+        settings = override_settings(AUCTIONS_THUMBNAIL_DIR=directory.name,
+                                     AUCTIONS_THUMBNAIL_ALLOWED_HOSTS=["127.0.0.1"])
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def url(self, path):
+        return self.base_url + path
+
+    def blobs(self):
+        return [name for _, _, names in os.walk(os.path.join(thumbnails.cache_dir(), "blobs")) for name in names]
+
+    def test_each_photo_is_fetched_once_and_resized(self):
+        from PIL import Image
+
+        first = thumbnails.request_thumbnails(self.url("/tall.png"))
+        second = thumbnails.request_thumbnails(self.url("/tall.png"))
+        ref = first.result()
+        self.assertIs(second, first)
+        self.assertEqual(set(ref), set(thumbnails.THUMBNAIL_SIZES))
+        self.assertFalse(thumbnails.has_thumbnails(self.url("/photo.png")))
+
+        for size, longest_side in thumbnails.THUMBNAIL_SIZES.items():
+            with Image.open(thumbnails.blob_path(ref[size])) as image:
+                self.assertEqual(max(image.size), longest_side)
+                self.assertEqual(image.format, "JPEG")
+
+        # Later pages get the local URL without fetching again
+        self.assertEqual(thumbnails.thumbnail_url(self.url("/tall.png"), "card"),
+                         reverse("thumbnail", args=[ref["card"]]))
+        self.assertEqual(self.hits["/tall.png"], 1)
+
+    def test_thumbnails_are_served_with_long_cache_headers(self):
+        ref = thumbnails.build_thumbnails(self.url("/photo.png"))
+        response = self.client.get(reverse("thumbnail", args=[ref["small"]]))
+
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        with open(thumbnails.blob_path(ref["small"]), "rb") as f:
+            self.assertEqual(b"".join(response.streaming_content), f.read())
+
+        self.assertEqual(self.client.get(reverse("thumbnail", args=["0" * 64])).status_code, 404)
+        self.assertEqual(self.client.get("/thumbnails/..%2Fsecret.jpg").status_code, 404)
+
+    def test_identical_photos_share_files(self):
+        first = thumbnails.build_thumbnails(self.url("/photo.png"))
+        second = thumbnails.build_thumbnails(self.url("/copy.png"))
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.blobs()), len(thumbnails.THUMBNAIL_SIZES))
+
+    def test_missing_thumbnails_are_requested_and_the_photo_shown_meanwhile(self):
+        source = self.url("/photo.png")
+        self.assertEqual(thumbnails.thumbnail_url(source, "card"), source)
+        thumbnails.request_thumbnails(source).result()
+        self.assertNotEqual(thumbnails.thumbnail_url(source, "card"), source)
+        self.assertEqual(self.hits["/photo.png"], 1)
+
+    def test_failures_are_not_retried_straight_away(self):
+        for path in ("/missing.png", "/text.png"):
+            self.assertIsNone(thumbnails.build_thumbnails(self.url(path)))
+            self.assertEqual(thumbnails.thumbnail_url(self.url(path), "card"), self.url(path))
+            self.assertEqual(self.hits[path], 1)
+
+    def test_only_public_addresses_are_fetched(self):
+        with override_settings(AUCTIONS_THUMBNAIL_ALLOWED_HOSTS=[]):
+            for url in (self.url("/photo.png"), "http://localhost/photo.png", "http://10.0.0.1/photo.png",
+                        "http://[::1]/photo.png", "file:///etc/passwd"):
+                with self.assertRaises(ValueError):
+                    thumbnails.check_public_url(url)
+            self.assertIsNone(thumbnails.build_thumbnails(self.url("/photo.png")))
+        self.assertEqual(self.hits["/photo.png"], 0)
+        thumbnails.check_public_url("http://93.184.216.34/photo.png")
+
+        # Redirects are checked too
+        self.assertIsNone(thumbnails.build_thumbnails(self.url("/redirect.png")))
+        self.assertEqual(self.hits["/redirect.png"], 1)
+
+    def test_least_recently_used_files_are_evicted(self):
+        refs = {path: thumbnails.build_thumbnails(self.url(path)) for path in ("/photo.png", "/other.png", "/tall.png")}
+
+        def size_of(path):
+            return sum(os.path.getsize(thumbnails.blob_path(digest)) for digest in refs[path].values())
+
+        # /other.png was used longest ago
+        now = time.time()
+        for path, age in (("/photo.png", 10), ("/other.png", 1000), ("/tall.png", 100)):
+            for digest in refs[path].values():
+                os.utime(thumbnails.blob_path(digest), (now - age, now - age))
+
+        limit = int((size_of("/photo.png") + size_of("/tall.png")) / thumbnails.EVICT_TO) + 1
+        with override_settings(AUCTIONS_THUMBNAIL_CACHE_BYTES=limit):
+            self.assertEqual(thumbnails.evict(), len(thumbnails.THUMBNAIL_SIZES))
+
+        self.assertTrue(thumbnails.has_thumbnails(self.url("/photo.png")))
+        self.assertTrue(thumbnails.has_thumbnails(self.url("/tall.png")))
+        self.assertFalse(thumbnails.has_thumbnails(self.url("/other.png")))
+
+    def test_building_keeps_cached_pages(self):
+        version = listings_version()
+        thumbnails.build_thumbnails(self.url("/photo.png"))
+        self.assertEqual(listings_version(), version)
+        # Nothing to evict
+        self.assertEqual(thumbnails.evict(), 0)
+        self.assertEqual(listings_version(), version)
+
+    def test_eviction_runs_after_enough_is_written(self):
+        def build(path, cache_bytes, check_seconds=thumbnails.EVICT_CHECK_SECONDS):
+            # Just after a check, with nothing written since
+            with override_settings(AUCTIONS_THUMBNAIL_CACHE_BYTES=cache_bytes), \
+                    mock.patch.multiple(thumbnails, _last_check=time.time(), _written_since_check=0,
+                                        EVICT_CHECK_SECONDS=check_seconds), \
+                    mock.patch.object(thumbnails, "evict") as evict:
+                thumbnails.build_thumbnails(self.url(path))
+            return evict.called
+
+        self.assertFalse(build("/photo.png", 10 ** 9))
+        # Written more than EVICT_CHECK_SHARE of the limit
+        self.assertTrue(build("/other.png", 1000))
+        # Too long since the last check
+        self.assertTrue(build("/tall.png", 10 ** 9, check_seconds=0))
+
+    def test_listing_cards_show_the_thumbnail(self):
+        seller = User.objects.create_user("seller", "seller@example.com", "password")
+        with self.captureOnCommitCallbacks(execute=True):
+            # Creating the listing requests its thumbnails
+            listing = Listing.objects.create(title="Oak table", lister=seller, photo_url=self.url("/photo.png"))
+        ref = thumbnails.request_thumbnails(listing.photo_url).result()
+
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, reverse("thumbnail", args=[ref["card"]]))
+        self.assertNotContains(response, listing.photo_url)
+        response = self.client.get(reverse("listings", args=[listing.id]))
+        self.assertContains(response, reverse("thumbnail", args=[ref["large"]]))
+
+
+class SQLiteTuningTests(SimpleTestCase):
+
+    def open_scratch_connection(self):
+        path = os.path.join(tempfile.mkdtemp(), "scratch.sqlite3")
+        default = connections["default"]
+        wrapper = default.__class__({**default.settings_dict, "NAME": path}, alias="scratch")
+        wrapper.ensure_connection()
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    @override_settings(AUCTIONS_SQLITE_TUNING=True)
+    def test_new_connections_are_tuned(self):
+        wrapper = self.open_scratch_connection()
+        self.assertEqual(self.pragma(wrapper, "journal_mode"), "wal")
+        self.assertEqual(self.pragma(wrapper, "synchronous"), 1)
+        self.assertEqual(self.pragma(wrapper, "busy_timeout"), 5000)
+        self.assertEqual(self.pragma(wrapper, "cache_size"), -64 * 1024)
+
+    def test_tuning_is_opt_in(self):
+        wrapper = self.open_scratch_connection()
+        self.assertEqual(self.pragma(wrapper, "journal_mode"), "delete")
+
+    def test_benchmark(self):
+        out = StringIO()
+        call_command("benchmark_sqlite", "--seconds", "0.2", "--readers", "2", "--writers", "2",
+                     "--listings", "100", stdout=out)
+        self.assertIn("default:", out.getvalue())
+        self.assertIn("tuned:", out.getvalue())
+
+
+class AsyncViewTests(TestCase):
+    # index, listingsByCategories, watchlist and listing GETs are async views
+
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.viewer = User.objects.create_user("viewer", "viewer@example.com", "password")
+        self.listing = Listing.objects.create(title="Oak table", price=Decimal("10.00"),
+                                              lister=self.seller, category="FURNITURE")
+        Watchlist.objects.create(watched_by=self.viewer, listing=self.listing)
+
+    async def test_pages_under_the_async_client(self):
+        for path in (reverse("index"), reverse("listingsByCategories") + "?category=FURNITURE",
+                     reverse("listings", args=[self.listing.id])):
+            response = await self.async_client.get(path)
+            self.assertContains(response, "Oak table")
+
+        await self.async_client.aforce_login(self.viewer)
+        response = await self.async_client.get(reverse("watchlist"))
+        self.assertContains(response, "Oak table")
+        self.assertEqual(response.context["watchlist_count"], 1)
+
+        response = await self.async_client.get(reverse("listings", args=[self.listing.id]))
+        self.assertTrue(response.context["is_watched"])
+
+    def test_bidding_still_runs_synchronously(self):
+        self.client.force_login(self.viewer)
+        response = self.client.post(reverse("listings", args=[self.listing.id]), {"bid": "12.00"})
+        self.assertContains(response, "Success")
+        self.assertEqual(Listing.objects.get(pk=self.listing.pk).price, Decimal("12.00"))
+
+
+class AsgiLoadTests(TransactionTestCase):
+
+    def test_benchmark(self):
+        seller = User.objects.create_user("seller", "seller@example.com", "password")
+        Listing.objects.create(title="Oak table", price=Decimal("10.00"), lister=seller)
+
+        out = StringIO()
+        call_command("benchmark_asgi", "--clients", "8", "--workers", "2",
+                     "--client-delay-ms", "100", stdout=out)
+        wsgi, asgi = out.getvalue().splitlines()
+        # Slow clients hold WSGI workers, but not the ASGI event loop
+        self.assertIn(" 2 in flight", wsgi)
+        self.assertIn(" 8 in flight", asgi)
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    # The replica is a second SQLite file, brought up to date by replicate()
+    # only, so anything written since then is visible on the primary alone.
+
+    # Covers the replica alias, which is added before the databases are checked
+    databases = "__all__"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.settings["replica"] = {
+            **connections["default"].settings_dict,
+            "NAME": os.path.join(cls.directory.name, "replica.sqlite3"),
+        }
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.settings["replica"]
+        cls.directory.cleanup()
+
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.bidder = User.objects.create_user("bidder", "bidder@example.com", "password")
+        self.listing = Listing.objects.create(title="Oak table", price=Decimal("10.00"), lister=self.seller)
+        self.client.force_login(self.bidder)
+        self.replicate()
+
+    def replicate(self):
+        primary = sqlite3.connect(connections["default"].settings_dict["NAME"])
+        replica = sqlite3.connect(connections.settings["replica"]["NAME"])
+        primary.backup(replica)
+        primary.close()
+        replica.close()
+
+    def get_listing(self):
+        return self.client.get(reverse("listings", args=[self.listing.id]))
+
+    @override_settings(AUCTIONS_DATABASE_REPLICAS=["replica"])
+    def test_read_only_views_read_from_the_replica(self):
+        Listing.objects.filter(pk=self.listing.pk).update(title="Walnut table")
+
+        self.assertContains(self.get_listing(), "Oak table")
+        self.replicate()
+        self.assertContains(self.get_listing(), "Walnut table")
+
+    def test_without_replicas_everything_reads_from_the_primary(self):
+        Listing.objects.filter(pk=self.listing.pk).update(title="Walnut table")
+        self.assertContains(self.get_listing(), "Walnut table")
+
+    @override_settings(AUCTIONS_DATABASE_REPLICAS=["replica"])
+    def test_other_views_read_from_the_primary(self):
+        # Only the primary has the watchlist entry; the count cache is empty,
+        # so the page counts it from whichever database the view reads
+        Watchlist.objects.create(watched_by=self.bidder, listing=self.listing)
+
+        response = self.client.get(reverse("createListing"))
+        self.assertEqual(response.context["watchlist_count"], 1)
+
+    @override_settings(AUCTIONS_DATABASE_REPLICAS=["replica"], AUCTIONS_REPLICA_PIN_SECONDS=60)
+    def test_users_read_their_own_writes(self):
+        response = self.client.post(reverse("listings", args=[self.listing.id]), {"bid": "12.00"})
+        self.assertContains(response, "Success")
+        self.assertIn("primary_until", response.cookies)
+        self.assertEqual(Bid.objects.filter(bid_for=self.listing).count(), 1)
+
+        # The replica hasn't seen the bid, but this user is pinned to the primary
+        self.assertContains(self.get_listing(), "12.00")
+
+        # Once the pin runs out they read from the replica again
+        self.client.cookies["primary_until"] = str(time.time() - 1)
+        self.assertNotContains(self.get_listing(), "12.00")
+
+    @override_settings(AUCTIONS_DATABASE_REPLICAS=["replica"])
+    def test_cached_pages_are_rendered_from_the_primary(self):
+        self.client.logout()
+        self.listing.title = "Walnut table"
+        self.listing.save()
+
+        # The replica still has "Oak table", but the page is cached for everyone
+        self.assertContains(self.client.get(reverse("index")), "Walnut table")
+        self.assertContains(self.client.get(reverse("index")), "Walnut table")
+        self.assertNotIn("primary_until", self.client.get(reverse("listingsByCategories")).cookies)
+
+    @override_settings(AUCTIONS_DATABASE_REPLICAS=["replica"])
+    def test_reads_only_requests_are_not_pinned(self):
+        response = self.get_listing()
+        self.assertNotIn("primary_until", response.cookies)
+
+
+class UserCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("alice", "alice@example.com", "password")
+        self.backend = CachedModelBackend()
+
+    def test_user_is_cached_until_saved(self):
+        with self.assertNumQueries(1):
+            self.backend.get_user(self.user.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.backend.get_user(self.user.id).email, "alice@example.com")
+
+        self.user.email = "new@example.com"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.backend.get_user(self.user.id).email, "new@example.com")
+
+    def test_async_loading_uses_the_cache(self):
+        async_to_sync(self.backend.aget_user)(self.user.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(async_to_sync(self.backend.aget_user)(self.user.id), self.user)
+
+    def test_inactive_users_are_not_loaded(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.backend.get_user(self.user.id))
+
+    def test_password_change_signs_out_other_sessions(self):
+        self.client.login(username="alice", password="password")
+        self.client.get(reverse("watchlist"))
+        # Signed in without a session or user query
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(reverse("watchlist")).status_code, 200)
+
+        self.user.set_password("a new password")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.client.get(reverse("watchlist")).status_code, 302)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_auth", "--requests", "3", stdout=out)
+        self.assertIn("saved  2.0 queries", out.getvalue())
+        self.assertFalse(User.objects.filter(username="benchmark-auth").exists())
+
+
+# Handlers for the job queue tests
+test_job_calls = []
+
+
+@jobs.handler("test_noop")
+def noop_job(**payload):
+    pass
+
+
+@jobs.handler("test_batch", batch=True)
+def batch_job(payloads):
+    test_job_calls.append(len(payloads))
+
+
+@jobs.handler("test_flaky", max_attempts=2)
+def flaky_job(**payload):
+    raise RuntimeError("mail server is down")
+
+
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        test_job_calls.clear()
+        self.seller = User.objects.create_user("seller", "seller@example.com", "password")
+        self.alice = User.objects.create_user("alice", "alice@example.com", "password")
+        self.bob = User.objects.create_user("bob", "bob@example.com", "password")
+        self.listing = Listing.objects.create(title="Clock", price=Decimal("10.00"), lister=self.seller)
+        self.worker = jobs.Worker(threads=1)
+
+    def run_jobs(self):
+        ran = 0
+        while True:
+            with self.captureOnCommitCallbacks(execute=True):
+                count = self.worker.run_once()
+            if not count:
+                return ran
+            ran += count
+
+    def test_outbid_alert(self):
+        place_bid(self.listing.id, self.alice, Decimal("20.00"))
+        self.client.force_login(self.bob)
+        self.client.post(reverse("listings", args=[self.listing.id]), {"bid": "25.00"})
+        self.assertTrue(Job.objects.filter(name="outbid_alert").exists())
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.run_jobs()
+        self.assertEqual([message.to for message in mail.outbox], [["alice@example.com"]])
+        self.assertIn("$25.00", mail.outbox[0].body)
+        self.assertFalse(Job.objects.exists())
+
+    def test_winner_notice(self):
+        place_bid(self.listing.id, self.alice, Decimal("20.00"))
+        close_listings([self.listing.id])
+        self.run_jobs()
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ["alice@example.com", "seller@example.com"])
+
+    def test_comment_notice(self):
+        self.client.force_login(self.alice)
+        self.client.post(reverse("createComment"), {"listing_id": self.listing.id, "comment": "Does it chime?"})
+        self.client.force_login(self.seller)
+        self.client.post(reverse("createComment"), {"listing_id": self.listing.id, "comment": "Every hour."})
+        self.run_jobs()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["seller@example.com"])
+        self.assertIn("alice wrote: Does it chime?", mail.outbox[0].body)
+
+    def test_batch_handler_is_called_once_per_batch(self):
+        jobs.enqueue_many("test_batch", [{"n": n} for n in range(5)])
+        jobs.enqueue("test_noop")
+        self.assertEqual(self.run_jobs(), 6)
+        self.assertEqual(test_job_calls, [5])
+
+    def test_failed_job_is_retried_with_backoff(self):
+        job = jobs.enqueue("test_flaky")
+        before = timezone.now()
+        with self.assertLogs("auctions.jobs", "ERROR"):
+            self.run_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNone(job.failed_at)
+        self.assertIn("mail server is down", job.last_error)
+        self.assertGreaterEqual(job.run_at, before + timedelta(seconds=jobs.RETRY_BASE_SECONDS))
+        self.assertEqual(jobs.retry_delay(3), timedelta(seconds=4 * jobs.RETRY_BASE_SECONDS))
+        self.assertEqual(jobs.retry_delay(20), timedelta(seconds=jobs.RETRY_MAX_SECONDS))
+
+        # Due again: the second failure is the last
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs("auctions.jobs", "ERROR"):
+            self.run_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNotNone(job.failed_at)
+        self.assertFalse(jobs.due_jobs().exists())
+
+    def test_claimed_jobs_are_not_claimed_twice(self):
+        jobs.enqueue_many("test_noop", [{}] * 3)
+        self.assertEqual(len(self.worker.claim()), 3)
+        self.assertEqual(jobs.Worker(threads=1).claim(), [])
+
+    def test_unknown_job(self):
+        with self.assertRaises(ValueError):
+            jobs.enqueue("no_such_job")
+
+    def test_finding_due_jobs_uses_the_index(self):
+        plan = jobs.due_jobs()[:100].explain()
+        self.assertIn("job_due_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+
+class JobQueueThroughputTests(TransactionTestCase):
+
+    JOBS = 3000
+    BACKLOG = 50000
+    REQUESTS = 30
+
+    def test_draining_and_enqueueing(self):
+        jobs.enqueue_many("test_noop", [{"n": n} for n in range(self.JOBS)])
+        worker = jobs.Worker(threads=4, batch_size=200)
+        start = time.perf_counter()
+        try:
+            while worker.run_once():
+                pass
+        finally:
+            worker.close()
+        elapsed = time.perf_counter() - start
+        logging.info("jobs: drained %d in %.3fs (%.0f jobs/s)", self.JOBS, elapsed, self.JOBS / elapsed)
+        self.assertFalse(Job.objects.exists())
+
+        # A view that enqueues a job costs the same with a long queue as with none
+        seller = User.objects.create_user("seller", "seller@example.com", "password")
+        listing = Listing.objects.create(title="Clock", lister=seller)
+        self.client.force_login(seller)
+
+        def comment_latency():
+            timings = []
+            for n in range(self.REQUESTS):
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    self.client.post(reverse("createComment"), {"listing_id": listing.id, "comment": f"Comment {n}"})
+                    timings.append((time.perf_counter() - start) * 1000)
+            return sorted(timings)[len(timings) // 2], len(captured)
+
+        empty_ms, empty_queries = comment_latency()
+        jobs.enqueue_many("test_noop", [{"n": n} for n in range(self.BACKLOG)])
+        backlog_ms, backlog_queries = comment_latency()
+        logging.info("jobs: createComment p50 %.2fms with an empty queue, %.2fms with %d jobs waiting",
+                     empty_ms, backlog_ms, self.BACKLOG + self.REQUESTS)
+
+        self.assertEqual(backlog_queries, empty_queries)
+        self.assertLess(backlog_ms, empty_ms * 2)
+
+
+class ConcurrentBidTests(TransactionTestCase):
+
+    THREADS = 8
+    BIDS_PER_THREAD = 25
+
+    def test_concurrent_bids_are_never_lost_or_out_of_order(self):
+        seller = User.objects.create_user("seller", "seller@example.com", "password")
+        bidders = [User.objects.create_user(f"bidder{i}", "", "password") for i in range(self.THREADS)]
+        listing = Listing.objects.create(title="Hot item", price=Decimal("1.00"), lister=seller)
+
+        accepted = []
+        attempts = []
+        errors = []
+        lock = threading.Lock()
+
+        def bid_loop(offset, bidder):
+            try:
+                for n in range(self.BIDS_PER_THREAD):
+                    # Interleave the amounts so threads are always racing each other
+                    amount = Decimal(2 + n * self.THREADS + offset)
+                    placed = place_bid(listing.id, bidder, amount)
+                    with lock:
+                        attempts.append(amount)
+                        if placed:
+                            accepted.append(amount)
+            except Exception as error:
+                # A thread that dies would otherwise just make fewer bids
+                with lock:
+                    errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=bid_loop, args=(i, bidder)) for i, bidder in enumerate(bidders)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        total = self.THREADS * self.BIDS_PER_THREAD
+        logging.info("place_bid: %d attempts in %.3fs (%.0f bids/s)", total, elapsed, total / elapsed)
+
+        stored = list(Bid.objects.filter(bid_for=listing).order_by("bid_id").values_list("bid", flat=True))
+        listing.refresh_from_db()
+
+        # Every attempt ran, every accepted bid was stored, each one higher
+        # than the one before, and the listing price is the last of them.
+        self.assertEqual(errors, [])
+        self.assertEqual(len(attempts), total)
+        self.assertEqual(sorted(stored), sorted(accepted))
+        self.assertEqual(stored, sorted(stored))
+        self.assertEqual(len(stored), len(set(stored)))
+        self.assertEqual(listing.price, stored[-1])
+        self.assertEqual(listing.bid_count, len(stored))
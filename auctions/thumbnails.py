@@ -0,0 +1,301 @@
+import hashlib
+import io
+import ipaddress
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.urls import reverse
+
+from .page_cache import bump_listings_version
+
+try:
+    from PIL import Image
+except ImportError:
+    # Without Pillow nothing is resized and pages show the original photos
+    Image = None
+
+
+# Thumbnails of listing photos, so pages don't load every seller's full-size
+# image. Each photo URL is fetched once by a pool of worker threads and resized
+# to the sizes in THUMBNAIL_SIZES. Files are stored on disk under the SHA-256
+# of their content, so their URLs never change and browsers may keep them
+# forever. A small "ref" file per photo URL records which file holds each of
+# its sizes.
+#
+# The cache is kept under AUCTIONS_THUMBNAIL_CACHE_BYTES by deleting the least
+# recently used files, using their modification time as the clock.
+
+logger = logging.getLogger(__name__)
+
+# Longest side in pixels of each size
+THUMBNAIL_SIZES = {"small": 160, "card": 320, "large": 800}
+
+# Photos bigger than this aren't downloaded
+MAX_SOURCE_BYTES = 10 * 1024 * 1024
+FETCH_TIMEOUT_SECONDS = 10
+# A photo that couldn't be fetched is tried again after this long
+RETRY_FAILED_SECONDS = 60 * 60
+# How stale a file's last-used time may get, so that serving it doesn't mean
+# a write every time
+TOUCH_INTERVAL_SECONDS = 60 * 60
+# Eviction stops when the cache is this far under its limit
+EVICT_TO = 0.9
+# evict() walks the whole cache, so builds only run it once this share of the
+# limit has been written since the last walk, or this long has passed
+EVICT_CHECK_SHARE = 0.05
+EVICT_CHECK_SECONDS = 10 * 60
+
+_pool = None
+_pending = {}
+_lock = threading.Lock()
+# Bytes written and time of the last eviction check, in this process
+_written_since_check = 0
+_last_check = 0.0
+
+
+def available():
+    return Image is not None
+
+
+def cache_dir():
+    return settings.AUCTIONS_THUMBNAIL_DIR
+
+
+def blob_path(digest):
+    return os.path.join(cache_dir(), "blobs", digest[:2], f"{digest}.jpg")
+
+
+def _ref_path(source_url):
+    key = hashlib.sha256(source_url.encode()).hexdigest()
+    return os.path.join(cache_dir(), "refs", key[:2], f"{key}.json")
+
+
+def _read_ref(source_url):
+    # (the {size: digest} record or None, whether fetching it failed recently)
+    path = _ref_path(source_url)
+    try:
+        with open(path) as f:
+            ref = json.load(f)
+    except (OSError, ValueError):
+        return None, False
+    if "error" in ref:
+        return None, time.time() - os.path.getmtime(path) < RETRY_FAILED_SECONDS
+    return ref, False
+
+
+def _write_atomically(path, data):
+    # Readers see the old file or the new one, never half of one
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def mark_used(path):
+    # Mark a file as recently used, at most once per TOUCH_INTERVAL_SECONDS
+    try:
+        if time.time() - os.path.getmtime(path) > TOUCH_INTERVAL_SECONDS:
+            os.utime(path)
+        return True
+    except OSError:
+        return False
+
+
+def thumbnail_url(source_url, size):
+    """
+    The local URL of source_url's thumbnail in size, or source_url itself if
+    there isn't one yet, in which case it is requested in the background.
+    """
+    if not source_url or not available():
+        return source_url
+
+    ref, failed = _read_ref(source_url)
+    if ref is not None and size in ref and mark_used(blob_path(ref[size])):
+        return reverse("thumbnail", args=[ref[size]])
+    if not failed:
+        request_thumbnails(source_url)
+    return source_url
+
+
+def has_thumbnails(source_url):
+    ref, _ = _read_ref(source_url)
+    return ref is not None and all(os.path.exists(blob_path(digest)) for digest in ref.values())
+
+
+def request_thumbnails(source_url):
+    """
+    Have the worker pool make source_url's thumbnails, unless it already is.
+    Returns the Future of the job.
+    """
+    global _pool
+    with _lock:
+        if source_url in _pending:
+            return _pending[source_url]
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=settings.AUCTIONS_THUMBNAIL_WORKERS,
+                                       thread_name_prefix="thumbnails")
+        future = _pool.submit(_build_in_pool, source_url)
+        _pending[source_url] = future
+        return future
+
+
+def _build_in_pool(source_url):
+    try:
+        return build_thumbnails(source_url)
+    except Exception:
+        logger.exception("Thumbnailing %s failed", source_url)
+    finally:
+        with _lock:
+            _pending.pop(source_url, None)
+
+
+def build_thumbnails(source_url):
+    """
+    Fetch source_url and store a thumbnail of it in every size. Returns
+    {size: digest}, or None if the photo couldn't be fetched or read, which is
+    remembered for RETRY_FAILED_SECONDS.
+    """
+    try:
+        image = _fetch(source_url)
+    except (OSError, ValueError, Image.DecompressionBombError) as error:
+        logger.info("Can't thumbnail %s: %s", source_url, error)
+        _write_atomically(_ref_path(source_url), json.dumps({"error": str(error)}).encode())
+        return None
+
+    ref = {}
+    written = 0
+    for size, longest_side in THUMBNAIL_SIZES.items():
+        data = _resize(image, longest_side)
+        digest = hashlib.sha256(data).hexdigest()
+        path = blob_path(digest)
+        # Another photo may have produced the same file already
+        if not mark_used(path):
+            _write_atomically(path, data)
+            written += len(data)
+        ref[size] = digest
+    _write_atomically(_ref_path(source_url), json.dumps(ref).encode())
+
+    # Cached pages keep showing the full-size photo, which is still there, until
+    # they are next rendered
+    if _eviction_due(written):
+        evict()
+    return ref
+
+
+def _eviction_due(written):
+    global _written_since_check, _last_check
+    with _lock:
+        _written_since_check += written
+        now = time.time()
+        if (_written_since_check < settings.AUCTIONS_THUMBNAIL_CACHE_BYTES * EVICT_CHECK_SHARE
+                and now - _last_check < EVICT_CHECK_SECONDS):
+            return False
+        _written_since_check = 0
+        _last_check = now
+        return True
+
+
+def check_public_url(url):
+    """
+    Raise ValueError unless url is http(s) and its host only resolves to
+    public addresses, so photo URLs can't be used to reach the server's own
+    network (loopback, private, link-local and cloud metadata addresses).
+    Hosts in AUCTIONS_THUMBNAIL_ALLOWED_HOSTS are let through.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("not an http(s) URL")
+    if parts.hostname in settings.AUCTIONS_THUMBNAIL_ALLOWED_HOSTS:
+        return
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    for *_, sockaddr in socket.getaddrinfo(parts.hostname, port, proto=socket.IPPROTO_TCP):
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global:
+            raise ValueError(f"{parts.hostname} is not a public address")
+
+
+class _PublicRedirectHandler(urllib.request.HTTPRedirectHandler):
+    # Checks every redirect as well as the first URL
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_public_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+_opener = urllib.request.build_opener(_PublicRedirectHandler)
+
+
+def _fetch(source_url):
+    # The host is looked up again to connect, so a DNS server that answers
+    # differently the second time could still get through; the checks stop
+    # plain URLs and redirects to internal addresses
+    check_public_url(source_url)
+    request = urllib.request.Request(source_url, headers={"User-Agent": "commerce-thumbnailer"})
+    with _opener.open(request, timeout=FETCH_TIMEOUT_SECONDS) as response:
+        data = response.read(MAX_SOURCE_BYTES + 1)
+    if len(data) > MAX_SOURCE_BYTES:
+        raise ValueError("photo is too large")
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+
+def _resize(image, longest_side):
+    thumbnail = image.copy()
+    thumbnail.thumbnail((longest_side, longest_side))
+    if thumbnail.mode != "RGB":
+        thumbnail = thumbnail.convert("RGB")
+    output = io.BytesIO()
+    thumbnail.save(output, "JPEG", quality=85, optimize=True)
+    return output.getvalue()
+
+
+def evict():
+    """
+    Delete the least recently used files until the cache is back under
+    EVICT_TO of AUCTIONS_THUMBNAIL_CACHE_BYTES. Returns the number deleted.
+    """
+    limit = settings.AUCTIONS_THUMBNAIL_CACHE_BYTES
+    files = []
+    total = 0
+    for root, _, names in os.walk(os.path.join(cache_dir(), "blobs")):
+        for name in names:
+            if not name.endswith(".jpg"):
+                # Still being written
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+    if total <= limit:
+        return 0
+
+    deleted = 0
+    for _, size, path in sorted(files):
+        if total <= limit * EVICT_TO:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        deleted += 1
+    if deleted:
+        # Pages that show the deleted files go back to the original photos and
+        # request them again
+        bump_listings_version()
+    return deleted
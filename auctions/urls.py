@@ -10,9 +10,22 @@ urlpatterns = [
     path("createComment", views.createComment, name="createComment"),
     path("createListing", views.createListing, name="createListing"),
     path("listings/<int:listing_id>", views.listing, name="listings"),
+    path("listings/<int:listing_id>/events", views.listingEvents, name="listingEvents"),
+    path("listings/<int:listing_id>/comments", views.listingComments, name="listingComments"),
     path("listingsByCategories", views.listingsByCategories, name="listingsByCategories"),
+    path("search", views.search, name="search"),
     path("closeListing/<int:listing_id>", views.closeListing, name="closeListing"),
     path("login", views.login_view, name="login"),
     path("logout", views.logout_view, name="logout"),
-    path("register", views.register, name="register")
+    path("register", views.register, name="register"),
+    path("metrics", views.metrics, name="metrics"),
+    path("listings/import", views.importListings, name="importListings"),
+    path("listings/export", views.exportListings, name="exportListings"),
+    path("thumbnails/<str:digest>.jpg", views.thumbnail, name="thumbnail"),
+    path("api/listings", views.apiListings, name="apiListings"),
+    path("api/listings/<int:listing_id>", views.apiListing, name="apiListing"),
+    path("api/listings/<int:listing_id>/bids", views.apiBidSummary, name="apiBidSummary"),
+    path("api/listings/<int:listing_id>/bids/history", views.apiBidHistory, name="apiBidHistory"),
+    path("api/listings/<int:listing_id>/bids/top", views.apiTopBids, name="apiTopBids"),
+    path("api/listings/<int:listing_id>/comments", views.apiComments, name="apiComments"),
 ]
\ No newline at end of file
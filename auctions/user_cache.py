@@ -0,0 +1,38 @@
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+# AuthenticationMiddleware loads the signed-in user on every request. This
+# backend keeps users in the cache, so that costs no query once the user has
+# been loaded. auctions.signals forgets a cached user when it is saved or
+# deleted; code that changes users with update() must call forget_user().
+
+USER_TIMEOUT = 60 * 60
+
+
+def _key(user_id):
+    return f"user:{user_id}"
+
+
+def forget_user(user_id):
+    cache.delete(_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+
+    def get_user(self, user_id):
+        user = cache.get(_key(user_id))
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(_key(user_id), user, USER_TIMEOUT)
+        return user
+
+    async def aget_user(self, user_id):
+        # get_user() for request.auser()
+        user = await cache.aget(_key(user_id))
+        if user is None:
+            user = await super().aget_user(user_id)
+            if user is not None:
+                await cache.aset(_key(user_id), user, USER_TIMEOUT)
+        return user
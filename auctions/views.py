@@ -1,38 +1,82 @@
+from asgiref.sync import sync_to_async
 from django.contrib.auth import authenticate, login, logout
-from django.db import IntegrityError
-from django.db.models import Count
-from django.http import HttpResponseRedirect
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
 from django.urls import reverse
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.utils import timezone
+from django.views.decorators.http import condition, require_GET, require_POST
+from datetime import timedelta
+import asyncio
+import io
+import json
 import logging
 from .listing_categories import LISTING_CATEGORIES
-
-from .models import User, Listing, Comment, Bid, Watchlist
+from .pagination import akeyset_page, keyset_page
+from .bidding import TOP_BIDS, atop_bids, ladder, ladder_page, place_bid, set_maximum_bid, top_bids
+from . import api, bulk_listings, jobs, thumbnails
+from .search import search_listings
+from .facets import acategory_facets
+from .closing import close_listings
+from .live import get_broker, listing_channel
+from .page_cache import cache_anonymous_page
+from .replicas import reads_from_replica
+from . import metrics as request_metrics
+from .watchlist_counts import adjust_watchlist_count, aget_watchlist_count
+
+from .models import User, Listing, Comment, Watchlist
 from .forms import BidForm, ListingForm, CommentForm, WatchlistForm
 
 logging.basicConfig(level=logging.INFO)
 
-def index(request):
+LISTINGS_PER_PAGE = 24
+# Deeper search pages are refused, as each one is read through an OFFSET
+MAX_SEARCH_PAGE = 100
+COMMENTS_PER_PAGE = 20
+LIVE_KEEPALIVE_SECONDS = 20
+
+async def load_user(request):
+    # Templates read request.user (and the watchlist count in the navigation
+    # bar) synchronously, so async views load both before rendering
+    request.user = await request.auser()
+    if request.user.is_authenticated:
+        await aget_watchlist_count(request.user)
+
+
+@reads_from_replica
+@cache_anonymous_page("after")
+async def index(request):
 
-    listings = Listing.objects.filter(active=True)
+    await load_user(request)
+
+    # Only fetch one page of listings, starting after the cursor in ?after=
+    listings, next_cursor = await akeyset_page(Listing.objects.filter(active=True),
+                                               request.GET.get("after"),
+                                               LISTINGS_PER_PAGE)
     
     return render(request, "auctions/index.html", {
         "listings": listings,
-        "watchlist_count": Watchlist.objects.filter(watched_by=request.user).count() if request.user.is_authenticated else None,
+        "next_cursor": next_cursor,
     })
 
 
-def listingsByCategories(request):
+@reads_from_replica
+@cache_anonymous_page("category")
+async def listingsByCategories(request):
 
     if request.method == "GET":
-        # LISTING_CATEGORIES is a list, where each item is a list of the category in uppercase and Title case. We are only getting the Title Case for each
-        categories = [category[1] for category in LISTING_CATEGORIES]
-        categories.insert(0, "Any")
+        await load_user(request)
+
+        # Each category with its number of active listings, plus "Any" for all of them
+        categories = await acategory_facets()
+        categories.insert(0, ("ANY", "Any", sum(count for _, _, count in categories)))
 
         # categories are stored in the server in uppercase.
         chosen_category = request.GET.get('category', '').upper()
-        logging.info(chosen_category)
 
         #None means no filter
         if chosen_category == "ANY" or not chosen_category:
@@ -41,101 +85,197 @@ def listingsByCategories(request):
             listings = Listing.objects.filter(active=True, category=chosen_category)
         return render(request, "auctions/listingsByCategory.html",{
             "categories": categories,
-            "listings": listings,
+            "chosen_category": chosen_category or "ANY",
+            "listings": [listing async for listing in listings],
         })
 
 
 
+def load_listing(listing_id, user):
+    """
+    Fetch a listing joined to its lister and winner, plus whether user watches
+    it, in one query.
+    """
+    return _listing_queryset(user).get(pk=listing_id)
+
+
+async def aload_listing(listing_id, user):
+    # load_listing() for async views
+    return await _listing_queryset(user).aget(pk=listing_id)
+
+
+def _listing_queryset(user):
+    listings = Listing.objects.select_related("lister", "winner")
+
+    if user.is_authenticated:
+        listings = listings.annotate(is_watched=Exists(
+            Watchlist.objects.filter(listing=OuterRef("pk"), watched_by=user)
+        ))
+
+    return listings
+
+
+@reads_from_replica
+def search(request):
+
+    query = request.GET.get("q", "")
+    chosen_category = request.GET.get("category", "").upper()
+    active = {"1": True, "0": False}.get(request.GET.get("active"))
+    try:
+        page = min(max(int(request.GET.get("page", 1)), 1), MAX_SEARCH_PAGE)
+    except ValueError:
+        page = 1
+
+    # Categories are stored in uppercase; "ANY" or nothing means no filter
+    category = chosen_category if chosen_category in dict(LISTING_CATEGORIES) else None
+
+    listings, has_next = search_listings(query, category=category, active=active,
+                                         page=page, per_page=LISTINGS_PER_PAGE)
+
+    # Keep the search filters in the next/previous page links
+    filters = request.GET.copy()
+    filters.pop("page", None)
+
+    return render(request, "auctions/search.html", {
+        "query": query,
+        "categories": LISTING_CATEGORIES,
+        "chosen_category": category,
+        "active": request.GET.get("active", ""),
+        "listings": listings,
+        "page": page,
+        "previous_page": page - 1 if page > 1 else None,
+        "next_page": page + 1 if has_next and page < MAX_SEARCH_PAGE else None,
+        "filters": filters.urlencode(),
+    })
+
+
 # @login_required(login_url="/login")
-def listing(request, listing_id):
-    
-    bid_count = Bid.objects.filter(bid_for=Listing.objects.get(pk=listing_id)).annotate(Count('bid'))
+@reads_from_replica
+async def listing(request, listing_id):
+
+    if request.method == "POST":
+        # Bids are placed in a transaction, which the async ORM can't run
+        return await sync_to_async(bid_on_listing)(request, listing_id)
+
+    await load_user(request)
+
     try:
-        watchlist_count = Watchlist.objects.filter(watched_by=request.user).count()
-    except:
-        watchlist_count = 0
+        current_listing = await aload_listing(listing_id, request.user)
+    except Listing.DoesNotExist:
+        return render(request, "auctions/listing.html", {
+            "listing": None,
+        })
+
+    comments, next_cursor = await akeyset_page(listing_comments(listing_id), None,
+                                               COMMENTS_PER_PAGE, date_field="date")
+    return render(request, "auctions/listing.html",
+                  listing_context(current_listing, await atop_bids(listing_id), comments, next_cursor))
+
+
+def listing_comments(listing_id):
+    # Paged by (date, id) over the comment_listing_date_idx index
+    return Comment.objects.filter(comment_for=listing_id).select_related("commenter")
+
+
+def listing_context(current_listing, top_bids, comments, next_comments_cursor):
+    # The page shows the first page of comments; the rest come from listingComments
+    return {
+        "form": BidForm,
+        "listing": current_listing,
+        "top_bids": top_bids,
+        "comments": comments,
+        "next_comments_cursor": next_comments_cursor,
+        "comment_form": CommentForm(initial={"listing_id": current_listing.id}),
+        "is_watched": getattr(current_listing, "is_watched", False),
+        "watchlist_form": WatchlistForm(initial={"listing_id": current_listing.id}),
+    }
+
+
+def bid_on_listing(request, listing_id):
 
     try:
-        current_listing = Listing.objects.get(pk=listing_id)
+        current_listing = load_listing(listing_id, request.user)
     except Listing.DoesNotExist:
         return render(request, "auctions/listing.html", {
             "listing": None,
-            "watchlist_count": watchlist_count 
         })
-    try: 
-        is_watched = True if Watchlist.objects.filter(
-            watched_by=request.user, 
-            listing=current_listing) else False
-    except:
-        is_watched = False
-        
-    # Fetch comments and initialise comment_form
-    comments = Comment.objects.filter(comment_for=Listing.objects.get(pk=listing_id))
-    comment_form = CommentForm(initial={"listing_id": listing_id})
+
+    message = ''
+    form = BidForm(request.POST)
+    previous_leader = current_listing.highest_bidder_id
     
-    watchlist_form = WatchlistForm(initial={"listing_id": listing_id})
+    # A listing past its end time takes no bids, even before it is closed
+    has_ended = current_listing.ends_at is not None and current_listing.ends_at <= timezone.now()
     
-    if request.method == "POST":
+    if form.is_valid() and current_listing.active == True and not has_ended:
         
-        message = ''
-        form = BidForm(request.POST)
+        bid = form.cleaned_data["bid"]
         
-        if form.is_valid() and current_listing.active == True:
-            
-            bid = form.cleaned_data["bid"]
-            
-            # The try except below might have a redundancy.
-            try: 
-                highest_bid = Bid.objects.filter(bid_for=current_listing).latest('bid').bid
-            except Bid.DoesNotExist:
-                highest_bid = current_listing.price
-            
-            if bid > highest_bid:
-                
-                # Store new bid into db
-                new_bid = Bid(bidder=request.user, bid=bid, bid_for=current_listing)
-                new_bid.save()
-                
-                # Update price of listing
-                current_listing.price = bid
-                current_listing.save()
-                message="Success! You have placed your new bid."
-                
+        # The check against the current price and the raise happen in the
+        # database, along with any bids made for other bidders' maximums
+        if form.cleaned_data["maximum"]:
+            accepted = set_maximum_bid(current_listing.id, request.user, bid)
+        else:
+            accepted = place_bid(current_listing.id, request.user, bid)
+
+        if accepted:
+            current_listing.refresh_from_db(fields=["price", "highest_bid", "highest_bidder", "bid_count"])
+            if previous_leader not in (None, current_listing.highest_bidder_id):
+                jobs.enqueue("outbid_alert", listing_id=current_listing.id, user_id=previous_leader)
+            if current_listing.highest_bidder_id != request.user.id:
+                message = "Another bidder's maximum bid is higher. You have been outbid."
+            elif form.cleaned_data["maximum"]:
+                message = f"Success! You lead, and will be bid for up to ${bid}."
             else:
-                message = "Bid must be higher than the current bid."
+                message="Success! You have placed your new bid."
             
         else:
-            message = "Bid is closed"
-            
-        return render(request, "auctions/listing.html", {
-            "form": BidForm,
-            "listing": current_listing,
-            "comments": comments,
-            "comment_form": comment_form,
-            "bid_count": len(bid_count),
-            "is_watched": is_watched,
-            "message": message,
-            "watchlist_count": watchlist_count,
-            "watchlist_form": watchlist_form,
-        })
+            message = "Bid must be higher than the current bid."
         
     else:
-        form = BidForm()
-        return render(request, "auctions/listing.html", {
-            "form": BidForm,
-            "listing": current_listing,
-            "comments": comments,
-            "comment_form": comment_form,
-            "bid_count": len(bid_count),
-            "is_watched": is_watched,
-            "watchlist_count": watchlist_count,
-            "watchlist_form": watchlist_form,
-    }) 
+        message = "Bid is closed"
+
+    comments, next_cursor = keyset_page(listing_comments(listing_id), None,
+                                        COMMENTS_PER_PAGE, date_field="date")
+    context = listing_context(current_listing, top_bids(current_listing.id), comments, next_cursor)
+    context["message"] = message
+            
+    return render(request, "auctions/listing.html", context)
+    
+
+async def listingEvents(request, listing_id):
+    """
+    Server-sent events for a listing: a "bid" event with the new price and
+    bid count after every accepted bid, and a "closed" event when it closes.
+    The stream stays open, so this needs to be served by commerce.asgi.
+    """
+    if not isinstance(request, ASGIRequest):
+        # A WSGI server would hold a worker thread for the whole stream and
+        # send nothing; 204 tells EventSource not to reconnect
+        return HttpResponse(status=204)
+
+    async def stream():
+        async with get_broker().subscribe(listing_channel(listing_id)) as subscription:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), LIVE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # A comment line stops proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                if event["type"] == "closed":
+                    return
+
+    return StreamingHttpResponse(stream(), content_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+    })
     
 
 @login_required(login_url='/login')
 def createListing(request):
-    watchlist_count = Watchlist.objects.filter(watched_by=request.user).count()
     if request.method == "POST":
         # Get Form
         form = ListingForm(request.POST)
@@ -150,6 +290,8 @@ def createListing(request):
                                 category=form["category"],
                                 photo_url=form['photo_url'],
                                 lister=request.user)
+            if form["duration"]:
+                new_listing.ends_at = timezone.now() + timedelta(days=form["duration"])
             new_listing.save()
 
             return HttpResponseRedirect(reverse('index'))
@@ -158,13 +300,11 @@ def createListing(request):
             return render(request, "auctions/create_listing.html", {
                 'form': form,
                 'error': "One of the fields are invalid.",
-                'watchlist_count': watchlist_count
             })
         
     else:
         return render(request, "auctions/create_listing.html", {
             'form': ListingForm,
-            "watchlist_count": watchlist_count,
         })
 
 
@@ -174,7 +314,6 @@ def closeListing(request, listing_id):
     if request.method == "GET":
         try:
             current_listing = Listing.objects.get(pk=listing_id)
-            logging.info("Checking for listing")
         except Listing.DoesNotExist:
             return HttpResponseRedirect('')
         
@@ -183,34 +322,27 @@ def closeListing(request, listing_id):
         
         else:
             
-            current_listing.active = False
-            current_listing.save()
+            # The highest bidder recorded on the listing becomes the winner
+            close_listings([current_listing.id])
             
-            try:
-                highest_bidder = Bid.objects.filter(bid_for=current_listing).latest('bid').bidder
-            except Bid.DoesNotExist:
+            if current_listing.highest_bidder_id is None:
                 return redirect('/')
                 
-            
-            current_listing.winner = highest_bidder
-            current_listing.save()
             return redirect(f'/listings/{listing_id}')   
 
 
+@reads_from_replica
 @login_required(login_url='/login')
-def watchlist(request):
+async def watchlist(request):
 
-    # Get ids of the listings watched by the user
-    watchlist_pks = Watchlist.objects.filter(watched_by=request.user).values_list('listing', flat=True)
-    if watchlist_pks:
-        # Get listings whose id are IN the watchlist id list.
-        listings = Listing.objects.filter(id__in=watchlist_pks)
-    else:
-        listings = {}
+    await load_user(request)
+
+    # Listings joined to the user's watchlist entries ("listing" is the reverse
+    # name of Watchlist.listing), so price and status are always current.
+    listings = Listing.objects.filter(listing__watched_by=request.user)
 
     return render(request, "auctions/watchlist.html", {
-        "watchlist": listings,
-        "watchlist_count": len(listings),
+        "watchlist": [listing async for listing in listings],
     })
     
 
@@ -226,19 +358,21 @@ def toggleWatchlist(request):
 
             user = request.user
 
-            listing = Listing.objects.get(id=form["listing_id"])
+            # Unwatch by deleting the entry. If there was nothing to delete the
+            # user wasn't watching it, so create one. The unique constraint on
+            # (watched_by, listing) turns a double click into a no-op.
+            deleted, _ = Watchlist.objects.filter(listing_id=form["listing_id"], watched_by=user).delete()
 
-            # If the item is not in the database as a watched item by the user, create an entry
-            try:
-                is_watching = Watchlist.objects.get(listing=listing, watched_by=user)
-            except Watchlist.DoesNotExist:
-                is_watching = False
-
-            if is_watching:
-                is_watching.delete()
+            if deleted:
+                adjust_watchlist_count(user.pk, -1)
             else:
-                watchlist_listing = Watchlist(listing=listing, watched_by=user)
-                watchlist_listing.save()
+                try:
+                    with transaction.atomic():
+                        Watchlist.objects.create(listing_id=form["listing_id"], watched_by=user)
+                except IntegrityError:
+                    pass
+                else:
+                    adjust_watchlist_count(user.pk, 1)
 
             return redirect(f"/listings/{form['listing_id']}")
 
@@ -297,22 +431,216 @@ def register(request):
     else:
         return render(request, "auctions/register.html")
 
+@reads_from_replica
+@require_GET
+def listingComments(request, listing_id):
+    # The page of a listing's comments after ?after=, for the listing page's
+    # "Load more comments" button: the rendered comments and the next cursor
+    comments, next_cursor = keyset_page(listing_comments(listing_id), request.GET.get("after"),
+                                        COMMENTS_PER_PAGE, date_field="date")
+    if not comments and not Listing.objects.filter(pk=listing_id).exists():
+        raise Http404("No such listing.")
+    return JsonResponse({
+        "html": render_to_string("auctions/comments.html", {"comments": comments}, request),
+        "next": next_cursor,
+    })
+
+
 @login_required(login_url='/login')
+@require_POST
 def createComment(request):
+    # Returns just the new comment, which the listing page adds to its list
     form = CommentForm(request.POST)
-    logging.info(form)
 
-    if form.is_valid():
-    
-        form = form.cleaned_data
-
-        listing_id = form['listing_id']
-        new_comment = Comment(
-                       comment=form['comment'],
-                       commenter= request.user,
-                       comment_for = Listing.objects.get(pk=listing_id),
-        )
-        new_comment.save()
-
-        return redirect(f"/listings/{listing_id}")
-    
\ No newline at end of file
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors}, status=400)
+
+    form = form.cleaned_data
+
+    listing_id = form['listing_id']
+    if not Listing.objects.filter(pk=listing_id).exists():
+        raise Http404("No such listing.")
+    new_comment = Comment(
+                   comment=form['comment'],
+                   commenter= request.user,
+                   comment_for_id = listing_id,
+    )
+    new_comment.save()
+    jobs.enqueue("comment_notice", comment_id=new_comment.id)
+
+    return render(request, "auctions/comments.html", {"comments": [new_comment]}, status=201)
+
+
+@user_passes_test(lambda user: user.is_staff, login_url='/login')
+def metrics(request):
+    # Request metrics collected by RequestMetricsMiddleware in this process
+    if request.method == "POST" and request.POST.get("reset"):
+        request_metrics.registry.reset()
+    return JsonResponse(request_metrics.registry.snapshot(), json_dumps_params={"indent": 2})
+
+
+@user_passes_test(lambda user: user.is_staff, login_url='/login')
+def importListings(request):
+    # Bulk create listings from an uploaded CSV or JSON lines file (see auctions/bulk_listings.py)
+    if request.method != "POST" or "file" not in request.FILES:
+        return JsonResponse({"error": "POST a CSV or JSON lines file as \"file\"."}, status=400)
+
+    upload = request.FILES["file"]
+    format = request.POST.get("format") or bulk_listings.format_for(upload.name)
+    if format not in bulk_listings.FORMATS:
+        return JsonResponse({"error": f"Unknown format {format!r}."}, status=400)
+
+    lister = request.user
+    if request.POST.get("lister"):
+        try:
+            lister = User.objects.get(username=request.POST["lister"])
+        except User.DoesNotExist:
+            return JsonResponse({"error": "No such lister."}, status=400)
+
+    # Large uploads are stored in a temporary file, which is read a line at a time
+    lines = io.TextIOWrapper(upload.file, encoding="utf-8", newline="")
+    try:
+        result = bulk_listings.import_listings(bulk_listings.read_rows(lines, format), lister)
+    except bulk_listings.READ_ERRORS as error:
+        return JsonResponse({"error": f"Couldn't read the file: {error}"}, status=400)
+    return JsonResponse(result)
+
+
+@user_passes_test(lambda user: user.is_staff, login_url='/login')
+def exportListings(request):
+    # Every listing with its bid statistics, streamed as CSV or JSON lines (?format=jsonl)
+    format = request.GET.get("format", "csv")
+    if format not in bulk_listings.FORMATS:
+        return JsonResponse({"error": f"Unknown format {format!r}."}, status=400)
+
+    content_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingHttpResponse(bulk_listings.export_rows(Listing.objects.all(), format),
+                                 content_type=content_type, headers={
+        "Content-Disposition": f'attachment; filename="listings.{format}"',
+    })
+
+
+def thumbnail(request, digest):
+    # A thumbnail from auctions/thumbnails.py. Its name is the hash of its
+    # content, so it never changes and browsers can keep it for good.
+    if len(digest) != 64 or not all(c in "0123456789abcdef" for c in digest):
+        raise Http404
+    path = thumbnails.blob_path(digest)
+    try:
+        response = FileResponse(open(path, "rb"), content_type="image/jpeg")
+    except FileNotFoundError:
+        raise Http404
+    thumbnails.mark_used(path)
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    response["ETag"] = f'"{digest}"'
+    return response
+
+
+# JSON API for the mobile apps (see auctions/api.py)
+
+def api_error(message, status):
+    return JsonResponse({"error": message}, status=status)
+
+
+@reads_from_replica
+@require_GET
+@condition(etag_func=api.feed_etag)
+def apiListings(request):
+    # Active listings, a page at a time like the index page
+    try:
+        fields = api.requested_fields(request, api.LISTING_FIELDS)
+    except ValueError as error:
+        return api_error(str(error), 400)
+
+    rows = api.select(Listing.objects.filter(active=True), fields, api.LISTING_FIELDS,
+                      extra=("id", "date_created"))
+    page, next_cursor = keyset_page(rows, request.GET.get("after"), api.FEED_PAGE_SIZE)
+    return JsonResponse({
+        "listings": [api.as_json(row, fields, api.LISTING_FIELDS) for row in page],
+        "next": next_cursor,
+    })
+
+
+@reads_from_replica
+@require_GET
+@condition(etag_func=api.listing_etag)
+def apiListing(request, listing_id):
+    return api_listing_fields(request, listing_id, api.LISTING_FIELDS)
+
+
+@reads_from_replica
+@require_GET
+@condition(etag_func=api.bid_summary_etag)
+def apiBidSummary(request, listing_id):
+    # The bid statistics kept on the listing, so no bids are read
+    return api_listing_fields(request, listing_id, api.BID_SUMMARY_FIELDS)
+
+
+def api_listing_fields(request, listing_id, available):
+    try:
+        fields = api.requested_fields(request, available)
+    except ValueError as error:
+        return api_error(str(error), 400)
+
+    row = api.select(Listing.objects.filter(pk=listing_id), fields, available).first()
+    if row is None:
+        return api_error("No such listing.", 404)
+    return JsonResponse(api.as_json(row, fields, available))
+
+
+@reads_from_replica
+@require_GET
+@condition(etag_func=api.bid_ladder_etag)
+def apiBidHistory(request, listing_id):
+    # Every bid on a listing, highest first, a page at a time
+    try:
+        fields = api.requested_fields(request, api.BID_FIELDS)
+    except ValueError as error:
+        return api_error(str(error), 400)
+
+    rows = api.select(ladder(listing_id), fields, api.BID_FIELDS, extra=("bid", "bid_id"))
+    page, next_cursor = ladder_page(rows, request.GET.get("after"), api.BID_HISTORY_PAGE_SIZE)
+    if not page and not Listing.objects.filter(pk=listing_id).exists():
+        return api_error("No such listing.", 404)
+    return JsonResponse({
+        "bids": [api.as_json(row, fields, api.BID_FIELDS) for row in page],
+        "next": next_cursor,
+    })
+
+
+@reads_from_replica
+@require_GET
+@condition(etag_func=api.bid_ladder_etag)
+def apiTopBids(request, listing_id):
+    # The n (?n=, at most MAX_TOP_BIDS) highest bids on a listing
+    try:
+        fields = api.requested_fields(request, api.BID_FIELDS)
+        n = min(max(int(request.GET.get("n", TOP_BIDS)), 1), api.MAX_TOP_BIDS)
+    except ValueError as error:
+        return api_error(str(error), 400)
+
+    rows = list(api.select(ladder(listing_id), fields, api.BID_FIELDS)[:n])
+    if not rows and not Listing.objects.filter(pk=listing_id).exists():
+        return api_error("No such listing.", 404)
+    return JsonResponse({"bids": [api.as_json(row, fields, api.BID_FIELDS) for row in rows]})
+
+
+@reads_from_replica
+@require_GET
+@condition(etag_func=api.comments_etag)
+def apiComments(request, listing_id):
+    # A listing's comments, oldest first, a page at a time
+    try:
+        fields = api.requested_fields(request, api.COMMENT_FIELDS)
+    except ValueError as error:
+        return api_error(str(error), 400)
+
+    rows = api.select(Comment.objects.filter(comment_for=listing_id), fields, api.COMMENT_FIELDS,
+                      extra=("id", "date"))
+    page, next_cursor = keyset_page(rows, request.GET.get("after"), api.COMMENTS_PAGE_SIZE, date_field="date")
+    if not page and not Listing.objects.filter(pk=listing_id).exists():
+        return api_error("No such listing.", 404)
+    return JsonResponse({
+        "comments": [api.as_json(row, fields, api.COMMENT_FIELDS) for row in page],
+        "next": next_cursor,
+    })
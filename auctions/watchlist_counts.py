@@ -0,0 +1,42 @@
+from django.core.cache import cache
+
+from .models import Watchlist
+
+
+# The watchlist badge in layout.html is drawn on every page, so the count of
+# each user's watched listings is kept in the cache. Views that add or remove
+# watchlist rows adjust the cached number rather than counting again.
+#
+# A toggle between a read's COUNT and its store finds nothing to adjust, so
+# the read stores with add() (a number written meanwhile wins) and the number
+# expires, so one that missed a toggle is counted again within COUNT_TIMEOUT.
+
+COUNT_TIMEOUT = 60 * 60
+
+def _key(user_id):
+    return f"watchlist_count:{user_id}"
+
+
+def get_watchlist_count(user):
+    count = cache.get(_key(user.pk))
+    if count is None:
+        count = Watchlist.objects.filter(watched_by=user).count()
+        cache.add(_key(user.pk), count, COUNT_TIMEOUT)
+    return count
+
+
+async def aget_watchlist_count(user):
+    # get_watchlist_count() for async views
+    count = await cache.aget(_key(user.pk))
+    if count is None:
+        count = await Watchlist.objects.filter(watched_by=user).acount()
+        await cache.aadd(_key(user.pk), count, COUNT_TIMEOUT)
+    return count
+
+
+def adjust_watchlist_count(user_id, delta):
+    # Nothing to adjust if the count isn't cached; the next read will count it
+    try:
+        cache.incr(_key(user_id), delta)
+    except ValueError:
+        pass
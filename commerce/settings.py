@@ -41,6 +41,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'auctions.metrics.RequestMetricsMiddleware',
+    'auctions.replicas.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,6 +65,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'auctions.context_processors.watchlist_count',
             ],
         },
     },
@@ -78,11 +81,45 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Use a file for the test database too. The default in-memory database
+        # uses SQLite's shared cache, which fails instead of waiting when two
+        # threads write at once, so it can't run the concurrent bidding tests.
+        'TEST': {
+            'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3'),
+        },
+    }
+}
+
+# Read-only views read from one of these aliases (add them to DATABASES); with
+# none, everything uses 'default'. After a user writes, their requests read from
+# 'default' for AUCTIONS_REPLICA_PIN_SECONDS, so replication lag doesn't hide
+# their own bids. See auctions/replicas.py.
+DATABASE_ROUTERS = ['auctions.replicas.ReplicaRouter']
+AUCTIONS_DATABASE_REPLICAS = []
+AUCTIONS_REPLICA_PIN_SECONDS = 5
+
+# Holds watchlist counts and cached pages. The local memory cache belongs to a
+# single process; when running several, point this at a shared cache such as
+# Memcached or Redis so they all see the same versions and counts.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
 AUTH_USER_MODEL = 'auctions.User'
 
+# Sessions and signed-in users are read from the cache, falling back to the
+# database, so an authenticated page view doesn't start with two queries.
+# Changes are only dropped from the cache of the process that made them: when
+# running several processes, use a shared cache (see CACHES above) or a user
+# who logs out or changes their password stays signed in on the others.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+AUTHENTICATION_BACKENDS = ['auctions.user_cache.CachedModelBackend']
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -119,4 +156,27 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
 
-STATIC_URL = '/static/'
\ No newline at end of file
+STATIC_URL = '/static/'
+# Passes live listing updates to the listingEvents streams (see auctions/live.py).
+# Serve the site with commerce.asgi so those streams can stay open.
+AUCTIONS_LIVE_BROKER = 'auctions.live.InProcessBroker'
+
+# Share of requests measured by auctions.metrics.RequestMetricsMiddleware,
+# from 0 (none) to 1 (all). Staff can read the numbers at /metrics.
+AUCTIONS_METRICS_SAMPLE_RATE = 1.0
+
+# Thumbnails of listing photos (see auctions/thumbnails.py; needs Pillow). They
+# are served by the thumbnail view, or straight from AUCTIONS_THUMBNAIL_DIR/blobs
+# by the web server, with a long cache lifetime.
+AUCTIONS_THUMBNAIL_DIR = os.path.join(BASE_DIR, 'thumbnails')
+AUCTIONS_THUMBNAIL_CACHE_BYTES = 512 * 1024 * 1024
+AUCTIONS_THUMBNAIL_WORKERS = 4
+# Photos are only fetched from public addresses, except from these hosts (such
+# as an image server on the local network)
+AUCTIONS_THUMBNAIL_ALLOWED_HOSTS = []
+
+# Emails (outbid alerts, winner notices) are sent by the background worker,
+# started with "python manage.py run_jobs" (see auctions/jobs.py). They are
+# printed to the console until a mail server is set up here.
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'auctions@localhost'
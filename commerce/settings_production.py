@@ -0,0 +1,37 @@
+"""
+Production settings for commerce.
+
+Use with DJANGO_SETTINGS_MODULE=commerce.settings_production. Everything not
+set here comes from commerce/settings.py.
+"""
+
+import os
+
+from .settings import *
+
+DEBUG = False
+
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost').split(',')
+
+# Compile each template once per process and keep it in memory, instead of
+# reading and parsing the file on every render.
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+# Fill the template cache at startup so no visitor waits for a compile
+AUCTIONS_PRECOMPILE_TEMPLATES = True
+
+# Measure a sample of requests rather than all of them
+AUCTIONS_METRICS_SAMPLE_RATE = 0.05
+
+# WAL, memory-mapped reads and a busy timeout on every SQLite connection
+# (see auctions/sqlite_tuning.py), and connections kept open between requests
+# instead of reopened for each one.
+AUCTIONS_SQLITE_TUNING = True
+DATABASES['default']['CONN_MAX_AGE'] = 600
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True